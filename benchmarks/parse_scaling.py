@@ -0,0 +1,27 @@
+"""
+Benchmark: parse time of `parse_dataframe` w.r.t. the number of edges
+
+Run from the repository root with `python -m benchmarks.parse_scaling`.
+The time per edge should stay roughly constant as the edge count grows.
+"""
+# import
+import time
+from jaal.datasets.synthetic import make_coauthorship
+from jaal.datasets.parse_dataframe import parse_dataframe
+
+def run(sizes=(1000, 10000, 100000, 1000000), repeat=3):
+    """Time `parse_dataframe` for every edge count in `sizes`, keeping the best of `repeat` runs
+    """
+    print(f"{'edges':>10} {'seconds':>10} {'us/edge':>10}")
+    for n_edges in sizes:
+        edge_df, node_df = make_coauthorship(n_edges)
+        best = float('inf')
+        for _ in range(repeat):
+            _edge_df, _node_df = edge_df.copy(), node_df.copy()
+            start = time.perf_counter()
+            parse_dataframe(_edge_df, _node_df)
+            best = min(best, time.perf_counter() - start)
+        print(f"{len(edge_df):>10} {best:>10.3f} {1e6 * best / len(edge_df):>10.2f}")
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,176 @@
+"""
+Benchmark suite: time and peak memory of the parse, layout and callback paths on
+synthetic co-authorship graphs (see `jaal.datasets.synthetic`)
+
+Run from the repository root with
+
+    python -m benchmarks.suite --sizes 1000 100000 --output results.json
+
+Every stage is run `--repeat` times from a cold cache, then once more under
+`tracemalloc` for its peak memory. The JSON report holds the first, best and
+median time of every stage and graph size, to compare between releases.
+"""
+# import
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+import dash
+import jaal
+from jaal import Jaal
+from jaal.layout import get_app_layout
+from jaal.styles import StyleCache
+from jaal.filters import FilterEngine
+from jaal.aggregate import Aggregator
+from jaal.positions import get_positions
+from jaal.datasets.synthetic import make_coauthorship
+from jaal.datasets.parse_dataframe import parse_dataframe
+
+# Constants
+#--------------
+SIZES = (1000, 10000, 100000, 1000000)
+# settings changed by the browser, sent to the main callback one at a time
+SCENARIOS = {
+    'initial': {},
+    'year_range': {'year_range.value': [2010, 2015]},
+    'edge_type': {'edgestype_input.value': ['LMLM']},
+    'filter_nodes': {'filter_nodes.value': 'npub > 10'},
+    'search': {'search_graph.value': 'City 1'},
+    'color_nodes': {'color_nodes.value': 'Country'},
+    'level': {'level_input.value': 'Country'},
+}
+# value of the main callback inputs before any change
+DEFAULTS = {'edgestype_input.value': ['LMLM', 'LMHC', 'HCHC'],
+            'edges_sc_input.value': ['Cross country edge', 'Domestic edge'],
+            'year_range.value': [2002, 2022], 'level_input.value': 'Node', 'expanded_groups.data': [],
+            'rank_input.value': 'Degree'}
+
+# Code
+#---------
+def measure(fn, setup=None, repeat=3):
+    """Time `fn(*setup())` `repeat` times, then get its peak traced memory
+
+    Returns the timings (in seconds), the peak memory (in MB) and the last result
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak / 2**20, result
+
+def _reset_caches(jaal_app):
+    """Drop the results computed by the previous callbacks"""
+    jaal_app.styles = StyleCache(jaal_app.store)
+    jaal_app.filter_engine = FilterEngine(jaal_app.store)
+    jaal_app.aggregator = Aggregator(jaal_app.store)
+    jaal_app.views.clear()
+    jaal_app.payloads.clear()
+
+def _post(client, dependency, values, triggered):
+    """Send the inputs of the main callback, like the browser does, and return the response"""
+    values = {**DEFAULTS, **values}
+    body = {'output': dependency['output'],
+            'outputs': [dict(zip(['id', 'property'], output.split('.')))
+                        for output in dependency['output'].strip('.').split('...')],
+            'inputs': [dict(x, value=values.get(f"{x['id']}.{x['property']}")) for x in dependency['inputs']],
+            'state': [dict(x, value=None) for x in dependency['state']],
+            'changedPropIds': [triggered] if triggered else []}
+    response = client.post('/_dash-update-component', json=body)
+    if response.status_code != 200:
+        raise Exception(f"The main callback failed with status {response.status_code}.")
+    return response.data
+
+def run_size(n_edges, repeat=3):
+    """Benchmark every stage on a synthetic graph of about `n_edges` edges"""
+    edge_df, node_df = make_coauthorship(n_edges)
+    results = []
+
+    def record(stage, times, peak, **extra):
+        results.append({'stage': stage, 'n_edges': len(edge_df), 'n_nodes': len(node_df),
+                        'first': times[0], 'best': min(times), 'median': statistics.median(times),
+                        'peak_mb': peak, **extra})
+        print(f"{len(edge_df):>10} {stage:<36} {min(times):>10.4f} {peak:>10.1f}", file=sys.stderr)
+
+    # parsing, on copies as the parser converts some columns in place
+    copies = lambda: (edge_df.copy(), node_df.copy())
+    record('parse_dataframe', *measure(parse_dataframe, copies, repeat)[:2])
+    record('parse_dataframe:parallel', *measure(lambda e, n: parse_dataframe(e, n, workers=None), copies, repeat)[:2])
+    record('store', *measure(lambda e, n: Jaal(e, n, cache=False), copies, repeat)[:2])
+    jaal_app = Jaal(edge_df.copy(), node_df.copy(), cache=False)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # a new directory every time, so the positions are computed
+        record('positions', *measure(lambda: get_positions(jaal_app.store, cache_dir=tempfile.mkdtemp(dir=cache_dir)),
+                                     repeat=repeat)[:2])
+        jaal_app.cache_dir = cache_dir
+        app = jaal_app.create(server_layout=True, max_nodes=2000, max_edges=10000)
+    view, _, _ = jaal_app.render_view({})
+    graph_data = view.to_visdcc(jaal_app.store)
+    record('get_app_layout', *measure(lambda: get_app_layout(graph_data, schema=jaal_app.store.schema,
+                                                              year_bounds=jaal_app.store.year_bounds),
+                                      repeat=repeat)[:2])
+
+    # the style callbacks, on the first column of the right kind
+    schema = jaal_app.store.schema
+    columns = {'_callback_color_nodes': schema['node'].categorical_features(20)[1:],
+               '_callback_size_nodes': schema['node'].numerical_features()[1:],
+               '_callback_color_edges': schema['edge'].categorical_features(20)[1:],
+               '_callback_size_edges': schema['edge'].numerical_features()[1:]}
+    for name, options in columns.items():
+        if not options:
+            continue
+        callback = getattr(jaal_app, name)
+        record(name, *measure(callback, lambda: (_reset_caches(jaal_app), options[0])[1:], repeat)[:2],
+               column=options[0])
+
+    # the main callback, through the server like the browser calls it
+    client = app.server.test_client()
+    dependency = [x for x in client.get('/_dash-dependencies').get_json() if 'graph.data' in x['output']][0]
+    for scenario, values in SCENARIOS.items():
+        triggered = next(iter(values), None)
+        times, peak, response = measure(lambda: _post(client, dependency, values, triggered),
+                                        lambda: _reset_caches(jaal_app) or (), repeat)
+        record(f'setting_pane_callback:{scenario}', times, peak, bytes=len(response))
+    return results
+
+def run(sizes=SIZES, repeat=3):
+    """Benchmark every size, and return the report"""
+    print(f"{'edges':>10} {'stage':<36} {'best (s)':>10} {'peak (MB)':>10}", file=sys.stderr)
+    results = []
+    for n_edges in sizes:
+        # keep the progress prints of the library out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.extend(run_size(n_edges, repeat))
+    return {'meta': {'jaal': jaal.__version__, 'python': platform.python_version(), 'numpy': np.__version__,
+                     'pandas': pd.__version__, 'dash': dash.__version__, 'platform': platform.platform(),
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': repeat},
+            'results': results}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="number of edges of the graphs")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of every stage")
+    parser.add_argument('--output', default='-', help="JSON report file, - for stdout")
+    args = parser.parse_args()
+    report = run(args.sizes, args.repeat)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=1)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
@@ -0,0 +1,166 @@
+"""
+Aggregate the nodes into Country or City supernodes, with the clicked groups expanded
+"""
+# import
+import numpy as np
+import pandas as pd
+from .cache import LRUCache
+from .layout import DEFAULT_COLOR, DEFAULT_NODE_SIZE
+
+# Constants
+#--------------
+# node columns grouped at every level of detail, the default level shows every node
+GROUP_LEVELS = {'City': ['Country', 'City'], 'Country': ['Country']}
+# supernode ids start with this, to tell them apart from the node ids
+GROUP_PREFIX = 'group:'
+# edge column whose values are counted on every superedge
+EDGE_TYPE_COLUMN = 'edgetype'
+
+# class
+class AggregateView:
+    """A view of supernodes and superedges, plus the nodes and edges of the expanded groups
+
+    The elements do not map to store rows, so the view is materialized once and
+    always sent in full (it is small by design).
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.withheld = {'nodes': 0, 'edges': 0}
+        # rough memory use, for the cache budget
+        self.nbytes = 300 * (len(data['nodes']) + len(data['edges']))
+
+    def to_visdcc(self, store):
+        """Materialize the view"""
+        return self.data
+
+class Aggregator:
+    """Level of detail views of a `GraphStore`, cached per settings
+
+    The nodes of a group that is not expanded are merged into one supernode, and
+    the edges are merged per pair of supernode/node, keeping their count and the
+    count of every edge type. Edges between two nodes of expanded groups are kept as is.
+    """
+
+    def __init__(self, store, cache=None):
+        """
+        Parameters
+        -------------
+        store: GraphStore
+            the graph data to aggregate
+
+        cache: LRUCache (optional)
+            cache of the aggregated views, shared by all the sessions
+        """
+        self.store = store
+        self.cache = LRUCache(max_items=64) if cache is None else cache
+        self._groups = {}
+        # code of the type of every edge
+        if EDGE_TYPE_COLUMN in store.edges:
+            self.edge_types, self.edge_type_names = pd.factorize(store.edges[EDGE_TYPE_COLUMN])
+        else:
+            self.edge_types, self.edge_type_names = np.zeros(store.n_edges, dtype=np.int64), pd.Index([])
+
+    @staticmethod
+    def levels(columns):
+        """The levels of detail available for the given node columns"""
+        return [level for level, group_columns in GROUP_LEVELS.items()
+                if all(col in columns for col in group_columns)]
+
+    def groups(self, level):
+        """Group code of every node, and the name of every group, for the level"""
+        if level not in self._groups:
+            keys = self.store.nodes[GROUP_LEVELS[level]].astype(str)
+            self._groups[level] = pd.factorize(keys.agg(':'.join, axis=1) if keys.shape[1] > 1 else keys.iloc[:, 0])
+        return self._groups[level]
+
+    def view(self, key, level, expanded, compute_masks, node_attrs=None, edge_attrs=None):
+        """Aggregated view, cached by `key`
+
+        Parameters
+        -------------
+        key: hashable
+            identifies the settings the view is built from
+
+        level: str
+            one of `GROUP_LEVELS`
+
+        expanded: list of str
+            ids of the supernodes to show node by node
+
+        compute_masks: function
+            returns the node mask, edge mask and hidden nodes (see `FilterEngine.evaluate`),
+            only called when the view is not cached
+
+        node_attrs, edge_attrs: dict (optional)
+            column name to full length array, overriding the stored column of the
+            nodes and edges that are kept
+        """
+        return self.cache.get_or_compute((key, self.store.version), lambda: self._aggregate(
+            level, expanded, *compute_masks(), node_attrs or {}, edge_attrs or {}))
+
+    def _aggregate(self, level, expanded, node_mask, edge_mask, hidden, node_attrs, edge_attrs):
+        store = self.store
+        codes, names = self.groups(level)
+        n_groups = len(names)
+        is_expanded = np.zeros(n_groups, dtype=bool)
+        expanded_codes = names.get_indexer([x[len(GROUP_PREFIX):] for x in expanded or []
+                                            if x.startswith(GROUP_PREFIX)])
+        is_expanded[expanded_codes[expanded_codes >= 0]] = True
+        # the unit of every node: its group, or the node itself (after the groups) if expanded
+        unit = np.where(is_expanded[codes], n_groups + np.arange(store.n_nodes), codes)
+        unit_ids = np.concatenate([(GROUP_PREFIX + names).values.astype(object),
+                                   store.nodes['id'].values.astype(object)])
+
+        # supernodes, with their visible members
+        members = np.bincount(codes[node_mask], minlength=n_groups)
+        shown = np.flatnonzero((members > 0) & ~is_expanded)
+        member_rows = np.flatnonzero(node_mask & is_expanded[codes])
+        # a supernode is hidden by the search if all of its members are
+        group_hidden = None
+        if hidden is not None:
+            group_hidden = np.bincount(codes[node_mask & ~hidden], minlength=n_groups) == 0
+            node_attrs = {**node_attrs, 'hidden': hidden}
+
+        # superedges, edges between expanded nodes stay as they are
+        rows = np.flatnonzero(edge_mask)
+        src, dst = unit[store.edge_src[rows]], unit[store.edge_dst[rows]]
+        detail = (src >= n_groups) & (dst >= n_groups)
+        rows, src, dst = rows[~detail], np.minimum(src, dst)[~detail], np.maximum(src, dst)[~detail]
+        n_units, n_types = n_groups + store.n_nodes, len(self.edge_type_names)
+        pairs, inverse, counts = np.unique(src * n_units + dst, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        type_counts = np.bincount(inverse * n_types + self.edge_types[rows],
+                                  minlength=len(pairs) * n_types).reshape(len(pairs), n_types)
+        pair_src, pair_dst = pairs // n_units, pairs % n_units
+        # the edges within a supernode are only counted
+        internal = np.bincount(pair_src[pair_src == pair_dst], counts[pair_src == pair_dst], minlength=n_units)
+
+        nodes = []
+        for g in shown.tolist():
+            node = {'id': unit_ids[g], 'label': f'{names[g]} ({members[g]})', 'shape': 'hexagon',
+                    'size': float(DEFAULT_NODE_SIZE + 2 * np.sqrt(members[g])), 'color': DEFAULT_COLOR,
+                    'title': f'{members[g]} nodes<br>{int(internal[g])} internal edges<br>click to expand',
+                    'members': int(members[g])}
+            if group_hidden is not None:
+                node['hidden'] = bool(group_hidden[g])
+            nodes.append(node)
+        # place the supernodes at the center of their members
+        if 'x' in node_attrs and 'y' in node_attrs and len(shown):
+            for axis in ['x', 'y']:
+                center = np.bincount(codes[node_mask], np.asarray(node_attrs[axis])[node_mask],
+                                     minlength=n_groups) / np.maximum(members, 1)
+                for node, value in zip(nodes, center[shown].tolist()):
+                    node[axis] = value
+        nodes.extend(store.to_visdcc(member_rows, member_rows[:0], node_attrs, None)['nodes'])
+
+        edges = []
+        for i in np.flatnonzero(pair_src != pair_dst).tolist():
+            a, b = unit_ids[pair_src[i]], unit_ids[pair_dst[i]]
+            title = f'{counts[i]} edges' + ''.join(f'<br>{name}: {count}' for name, count
+                                                   in zip(self.edge_type_names, type_counts[i].tolist()) if count)
+            edges.append({'id': f'{a}--{b}', 'from': a, 'to': b, 'title': title, 'count': int(counts[i]),
+                          'width': float(1 + np.log2(counts[i])), 'color': {'color': DEFAULT_COLOR}})
+        detail_rows = np.flatnonzero(edge_mask)[detail]
+        edges.extend(store.to_visdcc(detail_rows[:0], detail_rows, None, edge_attrs)['edges'])
+        return AggregateView({'nodes': nodes, 'edges': edges})
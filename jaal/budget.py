@@ -0,0 +1,73 @@
+"""
+Cap the number of nodes and edges sent to the browser, keeping the highest ranked ones
+"""
+# import
+import numpy as np
+
+# Constants
+#--------------
+# ranking of the nodes by their number of visible edges, the other policies are numerical node columns
+RANK_BY_DEGREE = 'Degree'
+
+# class
+class RenderBudget:
+    """Keep at most `max_nodes` nodes and `max_edges` edges of a view, per page
+
+    The visible nodes are ranked by degree (within the visible edges) or by a
+    numerical node column, and the top ones are kept with the edges between them.
+    If that is still too many edges, the edges whose ends rank highest are kept.
+    Every page ("load more") adds another budget worth of elements.
+    """
+
+    def __init__(self, store, max_nodes=None, max_edges=None):
+        """
+        Parameters
+        -------------
+        store: GraphStore
+            the graph data
+
+        max_nodes, max_edges: int or None
+            the elements sent per page, None for no limit
+        """
+        self.store = store
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+
+    def node_scores(self, rank_value, edge_mask):
+        """Score of every node, the higher the sooner it is shown"""
+        if rank_value in (None, RANK_BY_DEGREE) or rank_value not in self.store.nodes:
+            return self.store.adjacency.degree(edge_mask).astype(float)
+        # missing values rank last
+        return np.nan_to_num(self.store.nodes[rank_value].values.astype(float), nan=-np.inf)
+
+    def apply(self, node_mask, edge_mask, rank_value=None, pages=1):
+        """Rows of the nodes and edges to send
+
+        Returns
+        -------
+            node_rows, edge_rows: array of int
+                the sorted rows within the budget
+
+            withheld: dict
+                the number of visible `nodes` and `edges` left out
+        """
+        max_nodes = self.max_nodes * pages if self.max_nodes else None
+        max_edges = self.max_edges * pages if self.max_edges else None
+        node_rows, edge_rows = np.flatnonzero(node_mask), np.flatnonzero(edge_mask)
+        withheld = {'nodes': 0, 'edges': 0}
+        scores = None
+        if max_nodes is not None and len(node_rows) > max_nodes:
+            scores = self.node_scores(rank_value, edge_mask)
+            kept = np.zeros(self.store.n_nodes, dtype=bool)
+            kept[node_rows[np.argsort(-scores[node_rows], kind='stable')[:max_nodes]]] = True
+            withheld['nodes'] = len(node_rows) - max_nodes
+            node_rows = np.flatnonzero(kept)
+            # the edges need both of their ends
+            edge_rows = edge_rows[kept[self.store.edge_src[edge_rows]] & kept[self.store.edge_dst[edge_rows]]]
+        if max_edges is not None and len(edge_rows) > max_edges:
+            if scores is None:
+                scores = self.node_scores(rank_value, edge_mask)
+            edge_scores = np.minimum(scores[self.store.edge_src[edge_rows]], scores[self.store.edge_dst[edge_rows]])
+            edge_rows = np.sort(edge_rows[np.argsort(-edge_scores, kind='stable')[:max_edges]])
+        withheld['edges'] = int(edge_mask.sum()) - len(edge_rows)
+        return node_rows, edge_rows, withheld
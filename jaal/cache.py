@@ -0,0 +1,114 @@
+"""
+Bounded, thread safe LRU cache for the results shared between sessions
+"""
+# import
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Constants
+#--------------
+# marker of a cache miss, as None can be a cached value
+_MISSING = object()
+# where the on-disk caches live, unless JAAL_CACHE_DIR says otherwise
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'jaal')
+
+# Code
+#---------
+def sizeof(value):
+    """Approximate memory used by a cached value, in bytes"""
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(x) for x in value)
+    return sys.getsizeof(value)
+
+def get_cache_dir(cache_dir=None):
+    """Directory of the on-disk caches, created if missing
+
+    Parameters
+    -----------
+    cache_dir: str (optional)
+        the directory to use, defaults to $JAAL_CACHE_DIR or ~/.cache/jaal
+    """
+    cache_dir = cache_dir or os.environ.get('JAAL_CACHE_DIR') or DEFAULT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+class LRUCache:
+    """Least recently used cache bounded by number of entries and total memory
+
+    Parameters
+    -----------
+    max_items: int
+        the maximum number of entries
+    max_bytes: int
+        the maximum total size of the entries (as measured by `sizeof`)
+    """
+
+    def __init__(self, max_items=256, max_bytes=64 * 2**20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, default=None):
+        """Cached value of the key, `default` if absent"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value):
+        """Cache the value, evicting the least recently used entries when over budget"""
+        size = sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            # values larger than the whole budget are not cached
+            if size > self.max_bytes:
+                return value
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while len(self.entries) > self.max_items or self.nbytes > self.max_bytes:
+                self.nbytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Cached value of the key, computed with `compute()` and cached on a miss
+
+        Two threads missing the same key may both compute it, the result is the same.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Hit/miss counters and memory usage"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {'items': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': self.hits / total if total else 0.0}
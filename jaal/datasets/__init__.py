@@ -1 +1,2 @@
-from .load_got import load_got
\ No newline at end of file
+from .load_got import load_got
+from .synthetic import make_coauthorship
@@ -0,0 +1,108 @@
+"""
+Read large node/edge files in chunks, with explicit dtypes and progress reporting
+"""
+# import
+import os
+import sys
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Constants
+#--------------
+# dtypes of the known edge and node columns, the repeated strings are read as categories
+EDGE_DTYPES = {'from': 'category', 'to': 'category', 'year-factor': 'int16', 'edgetype': 'category',
+               'edge_sc': 'category'}
+NODE_DTYPES = {'id': 'str', 'Country': 'category', 'City': 'category', 'Country_type': 'category'}
+# rows read at once
+CHUNK_SIZE = 1000000
+
+# Code
+#---------
+def _progress(label, done, total, rows):
+    """Print the reading progress on one line"""
+    percent = f"{100 * done / total:5.1f}%" if total else ""
+    sys.stdout.write(f"\rReading {label}... {percent} {rows} rows")
+    sys.stdout.flush()
+
+def _chunks(path, dtype, chunksize):
+    """Yield the chunks of the file, with the bytes read so far and the file size"""
+    total = os.path.getsize(path)
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Reading parquet files needs pyarrow, please install it.")
+        parquet = pq.ParquetFile(path)
+        done, n_rows = 0, max(parquet.metadata.num_rows, 1)
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            done += batch.num_rows
+            chunk = batch.to_pandas()
+            yield chunk.astype({col: t for col, t in dtype.items() if col in chunk}), total * done // n_rows, total
+        return
+    with open(path, 'rb') as f:
+        # only the known columns present in the file get their dtype
+        header = pd.read_csv(f, nrows=0).columns
+        f.seek(0)
+        for chunk in pd.read_csv(f, dtype={col: t for col, t in dtype.items() if col in header},
+                                 chunksize=chunksize):
+            yield chunk, f.tell(), total
+
+def concat_chunks(chunks, order=None):
+    """Concatenate the chunks one column at a time, emptying them along the way
+
+    The categories of the categorical columns are merged, so they stay categorical.
+    Only one column is held twice at a time, instead of the whole frame.
+
+    Parameters
+    -----------
+    chunks: list of pandas dataframe
+        the chunks, with the same columns
+    order: array of int (optional)
+        the rows to take from the concatenated frame, in order
+    """
+    columns = {}
+    for col in list(chunks[0].columns):
+        parts = [chunk.pop(col) for chunk in chunks]
+        if len(parts) > 1 and all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            column = pd.Series(union_categoricals(parts))
+        else:
+            column = pd.concat(parts, ignore_index=True)
+        del parts
+        columns[col] = column if order is None else column.take(order).reset_index(drop=True)
+        del column
+    return pd.DataFrame(columns, copy=False)
+
+def read_chunks(path, dtype=None, chunksize=CHUNK_SIZE, progress=True, label='rows'):
+    """Yield the chunks of a CSV (or parquet) file, printing the progress
+
+    Parameters
+    -----------
+    path: str
+        the CSV or parquet (needs pyarrow) file
+    dtype: dict (optional)
+        the dtype of the columns, the others are inferred
+    chunksize: int
+        rows read at once
+    progress: boolean
+        print the progress while reading
+    label: str
+        what is being read, for the progress
+    """
+    rows = 0
+    for chunk, done, total in _chunks(path, dtype or {}, chunksize):
+        rows += len(chunk)
+        if progress:
+            _progress(label, done, total, rows)
+        yield chunk
+    if progress:
+        print()
+
+def read_frame(path, dtype=None, chunksize=CHUNK_SIZE, progress=True, label='rows'):
+    """Read a CSV (or parquet) file in chunks, see `read_chunks`
+
+    The whole file is held in memory, the categorical columns stay categorical.
+    """
+    chunks = list(read_chunks(path, dtype, chunksize, progress, label))
+    if not chunks:
+        return pd.read_csv(path, nrows=0)
+    return concat_chunks(chunks)
@@ -1,10 +1,21 @@
 """
 Parse network data from dataframe format into visdcc format
 """
-import random
-import visdcc
 import textwrap
 import math
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from .schema import describe_frames
+from .ingest import concat_chunks
+
+# default edge color, kept in sync with `layout.DEFAULT_COLOR`
+EDGE_COLOR = '#97C2FC'
+# bump when the parsed output changes, to invalidate the cached graphs
+PARSER_VERSION = 2
+# fewer nodes than this are parsed in the calling process, a pool costs more than it saves
+MIN_PARALLEL_ROWS = 20000
 
 def compute_scaling_vars_for_numerical_cols(df):
     """Identify and scale numerical cols"""
@@ -20,8 +31,102 @@ def compute_scaling_vars_for_numerical_cols(df):
     # return
     return scaling_vars
 
-def parse_dataframe(edge_df, node_df=None):
-    """Parse the network dataframe into visdcc format
+def _node_titles(node_df):
+    """Build the hover title of every node
+
+    Author lists with 8 or more entries are wrapped at 80 chars with `<br>`
+    """
+    titles = []
+    for pmid_list, au_list in zip(node_df['pmid_list'].astype(str), node_df['au_list'].astype(str)):
+        if len(au_list.split(',')) >= 8:
+            au_list = '<br>'.join(textwrap.wrap(au_list, 80))
+        titles.append(pmid_list + '<br>' + au_list)
+    return titles
+
+def _node_title_series(node_df):
+    """`_node_titles` indexed like `node_df`, run on a partition by the workers"""
+    return pd.Series(_node_titles(node_df), index=node_df.index, dtype=object)
+
+def resolve_workers(workers):
+    """Number of processes for `workers`, None meaning one per CPU"""
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(int(workers), 1)
+
+def map_partitions(func, df, workers=1):
+    """Apply `func` to row partitions of `df` in a process pool, and concatenate the results in order
+
+    `func` takes a dataframe and returns a series (or dataframe) with the same index,
+    and has to be a module level function to be sent to the workers. Small frames,
+    and `workers=1`, are done at once in the calling process, with the same result.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1 or len(df) < MIN_PARALLEL_ROWS:
+        return func(df)
+    # a few partitions per worker, so one slow partition does not hold the others
+    bounds = np.linspace(0, len(df), workers * 4 + 1).astype(int)
+    parts = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    with ProcessPoolExecutor(workers) as pool:
+        return pd.concat(list(pool.map(func, parts)))
+
+def parse_nodes(edge_df, node_df=None, workers=1):
+    """Create the node frame with the visdcc specific columns added
+
+    The titles, the per node Python work, are built by `workers` processes.
+    Returns the node frame and the node id to `idd` mapping (as pandas series)
+    """
+    if node_df is None:
+        node_list = list(set(edge_df['from'].unique().tolist() + edge_df['to'].unique().tolist()))
+        nodes_df = pd.DataFrame({'id': node_list, 'shape': 'dot', 'size': 7})
+        return nodes_df, pd.Series(node_list, index=node_list)
+    # convert the node id column to string
+    node_df.loc[:, 'id'] = node_df.loc[:, 'id'].astype(str)
+    node_df.loc[:, 'idd'] = node_df.loc[:, 'Country'].astype(str)+':'+\
+                           node_df.loc[:, 'City'].astype(str)+':'+\
+                           node_df.loc[:, 'id']
+    nodes_df = node_df.copy()
+    nodes_df['label'] = nodes_df['idd']
+    nodes_df['title'] = map_partitions(_node_title_series, nodes_df[['pmid_list', 'au_list']], workers).values
+    nodes_df['shape'] = np.where(nodes_df['Country_type'] == 'LMIC', 'square', 'dot')
+    nodes_df['size'] = 7
+    # id -> idd mapping, the first node wins in case of duplicated ids
+    idd_map = node_df.drop_duplicates('id').set_index('id')['idd']
+    return nodes_df, idd_map
+
+def parse_edges(edge_df, idd_map, keep_dtypes=False):
+    """Create the edge frame with the visdcc specific columns added
+
+    Parameters
+    -------------
+    edge_df: pandas dataframe
+            The network edge data with `from` and `to` already as string, unless `keep_dtypes`
+
+    idd_map: pandas series or None
+            Mapping of node id to the node `idd` label, None if the `idd` is the id
+
+    keep_dtypes: boolean
+            leave `from`, `to` and `year-factor` in their dtype (like category or int),
+            instead of converting `year-factor` to string in place (default: False)
+    """
+    if keep_dtypes:
+        edges_df = edge_df.copy()
+        source, target, year = [edges_df[col].astype(str) for col in ['from', 'to', 'year-factor']]
+    else:
+        edge_df.loc[:, 'year-factor'] = edge_df.loc[:, 'year-factor'].astype(str)
+        edges_df = edge_df.copy()
+        source, target, year = edges_df['from'], edges_df['to'], edges_df['year-factor']
+    from_idd, to_idd = (source, target) if idd_map is None else (source.map(idd_map), target.map(idd_map))
+    if from_idd.isna().any() or to_idd.isna().any():
+        raise Exception("Edge dataframe contains node ids missing in the node dataframe.")
+    edges_df['id'] = source + "__" + target + '/' + year
+    edges_df['idd'] = from_idd + "--" + to_idd + "/" + year
+    edges_df['title'] = edges_df['id']
+    edges_df['color'] = EDGE_COLOR
+    edges_df['selfReferenceSize'] = np.log((year.astype(int) - 2001) / 0.2) / math.log(1.2)
+    return edges_df
+
+def parse_frames(edge_df, node_df=None, workers=1):
+    """Parse the network dataframe into node and edge frames holding the visdcc columns
 
     Parameters
     -------------
@@ -30,6 +135,16 @@ def parse_dataframe(edge_df, node_df=None):
 
     node_df: pandas dataframe (optional)
             The network node data stored in format of pandas dataframe
+
+    workers: int (optional)
+            processes parsing the nodes, None for one per CPU (default: 1). The
+            output is the same whatever the number of workers
+
+    Returns
+    -------------
+    nodes_df, edges_df, scaling_vars, schema
+        the edge `color` column holds the plain color string, `schema` is the
+        `FrameSchema` of the node and edge frames
     """
     # Data checks
     # Check 1: mandatory columns presence
@@ -49,59 +164,86 @@ def parse_dataframe(edge_df, node_df=None):
         scaling_vars['node'] = compute_scaling_vars_for_numerical_cols(node_df)
     scaling_vars['edge'] = compute_scaling_vars_for_numerical_cols(edge_df)
 
-    # create node list w.r.t. the presence of absence of node_df
-    nodes = []
+    # create node and edge frames, one column at a time
+    nodes_df, idd_map = parse_nodes(edge_df, node_df, workers)
+    edges_df = parse_edges(edge_df, idd_map)
+    nodes_df, edges_df = nodes_df.reset_index(drop=True), edges_df.reset_index(drop=True)
+    # describe the columns once, so the layout and callbacks never scan the data again
+    return nodes_df, edges_df, scaling_vars, describe_frames(nodes_df, edges_df)
+
+def parse_chunks(edge_chunks, node_df=None, workers=1):
+    """Parse the network data like `parse_frames`, with the edges given in chunks
+
+    Every chunk is parsed against the node `idd` map as it comes, and the parsed
+    chunks are concatenated at the end (sorted by year, like the store keeps them),
+    so the raw edge data is never held at once. The columns keep their dtype, like
+    the categorical columns or the integer `year-factor`.
+
+    Parameters
+    -------------
+    edge_chunks: iterable of pandas dataframe
+            The network edge data, in chunks
+
+    node_df: pandas dataframe (optional)
+            The network node data
+
+    workers: int (optional)
+            processes parsing the nodes, see `parse_frames`
+    """
+    idd_map, scaling_vars = None, {'node': None, 'edge': {}}
+    if node_df is not None:
+        if 'id' not in node_df.columns:
+            raise Exception("Node dataframe missing 'id' column.")
+        scaling_vars['node'] = compute_scaling_vars_for_numerical_cols(node_df)
+        nodes_df, idd_map = parse_nodes(None, node_df, workers)
+    parsed, years, node_ids = [], [], set()
+    for chunk in edge_chunks:
+        if ('from' not in chunk.columns) or ('to' not in chunk.columns):
+            raise Exception("Edge dataframe missing either 'from' or 'to' column.")
+        for col, bounds in compute_scaling_vars_for_numerical_cols(chunk).items():
+            known = scaling_vars['edge'].setdefault(col, bounds)
+            known['min'], known['max'] = min(known['min'], bounds['min']), max(known['max'], bounds['max'])
+        if node_df is None:
+            for col in ['from', 'to']:
+                node_ids.update(chunk[col].astype(str).unique().tolist())
+        years.append(chunk['year-factor'].astype(int).values)
+        parsed.append(parse_edges(chunk, idd_map, keep_dtypes=True))
+        del chunk
+    if not parsed:
+        raise Exception("Edge data has no rows.")
     if node_df is None:
-        node_list = list(set(edge_df['from'].unique().tolist() + edge_df['to'].unique().tolist()))
-        nodes = [{'id': node_name,'shape': 'dot', 'size': 7} for node_name in node_list]
-    else:
-        # convert the node id column to string
-        node_df.loc[:, 'id'] = node_df.loc[:, 'id'].astype(str)
-        node_df.loc[:, 'idd'] = node_df.loc[:, 'Country'].astype(str)+':'+\
-                               node_df.loc[:, 'City'].astype(str)+':'+\
-                               node_df.loc[:, 'id'].astype(str)
-        # create the node data
-        for node in node_df.to_dict(orient='records'):
-            ll=len(str(node['au_list']).split(','))
-            if ll>=8:
-                rown=int(ll/5)+1
-                nodetitle=textwrap.wrap(str(node['au_list']),80)
-                nodetitle='<br>'.join(nodetitle)
-
-                if node['Country_type']=='LMIC':
-                    nodes.append({**node, **{'label': node['idd'],
-                                             'title': str(node['pmid_list'])+'<br>'+nodetitle,
-                                             'shape': 'square', 'size': 7}})
-                else:
-                    nodes.append({**node, **{'label': node['idd'],
-                                             'title': str(node['pmid_list'])+'<br>'+nodetitle,
-                                             'shape': 'dot', 'size': 7}})
-            else:
-                if node['Country_type']=='LMIC':
-                    nodes.append({**node, **{'label': node['idd'],
-                                             'title':str(node['pmid_list'])+'<br>'+str(node['au_list']),
-                                             'shape': 'square', 'size': 7}})
-                else:
-                    nodes.append({**node, **{'label': node['idd'],
-                                             'title': str(node['pmid_list']) + '<br>' + str(node['au_list']),
-                                             'shape': 'dot', 'size': 7}})
-
-    # create edges from df
-    edges = []
-    edge_df.loc[:, 'year-factor'] = edge_df.loc[:, 'year-factor'].astype(str)
-    for row in edge_df.to_dict(orient='records'):
-        edges.append({**row,
-                      **{'id':row['from']+"__" +row['to']+'/'+str(row['year-factor']),
-                         'idd':node_df.loc[node_df[node_df['id']==row['from']].index[0],'idd']+ \
-                               "--" +\
-                               node_df.loc[node_df[node_df['id']==row['to']].index[0],'idd']+"/"+str(row['year-factor']),
-                         'title': str(row['from'])+"__" +str(row['to'])+'/'+str(row['year-factor']),
-                         'year-factor':str(row['year-factor']),
-                         'color': {'color': '#97C2FC'},
-                         "selfReferenceSize": math.log((int(row['year-factor'])-2001)/0.2,1.2)
-                         }
-                      })
-        # edges.append({**row, **{'id': row['from'] + "__" + row['to'],  'color': {'color': '#97C2FC'}}})
+        node_list = list(node_ids)
+        nodes_df = pd.DataFrame({'id': node_list, 'shape': 'dot', 'size': 7})
+    year = np.concatenate(years)
+    order = None if np.all(year[:-1] <= year[1:]) else np.argsort(year, kind='stable')
+    edges_df = concat_chunks(parsed, order)
+    nodes_df = nodes_df.reset_index(drop=True)
+    return nodes_df, edges_df, scaling_vars, describe_frames(nodes_df, edges_df)
+
+def parse_dataframe(edge_df, node_df=None, with_schema=False, workers=1):
+    """Parse the network dataframe into visdcc format
 
+    Parameters
+    -------------
+    edge_df: pandas dataframe
+            The network edge data stored in format of pandas dataframe
+
+    node_df: pandas dataframe (optional)
+            The network node data stored in format of pandas dataframe
+
+    with_schema: boolean
+            also return the column metadata of the nodes and edges (default: False)
+
+    workers: int (optional)
+            processes parsing the nodes, see `parse_frames`
+    """
+    nodes_df, edges_df, scaling_vars, schema = parse_frames(edge_df, node_df, workers)
+    edges = edges_df.to_dict(orient='records')
+    # every edge gets its own color dict as the color callbacks update it in place
+    for edge in edges:
+        edge['color'] = {'color': edge['color']}
+    data = {'nodes': nodes_df.to_dict(orient='records'), 'edges': edges}
     # return
-    return {'nodes': nodes, 'edges': edges}, scaling_vars
\ No newline at end of file
+    if with_schema:
+        return data, scaling_vars, schema
+    return data, scaling_vars
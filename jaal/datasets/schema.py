@@ -0,0 +1,81 @@
+"""
+Column metadata of the parsed node and edge frames, computed once at parse time
+"""
+# import
+import pandas as pd
+
+# Constants
+#--------------
+# supported numerical cols
+NUMERICS = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
+
+# Code
+#---------
+class FrameSchema:
+    """dtype, cardinality, min/max and value set of every column of a frame
+
+    `columns` maps every column name to a dict with
+        - `dtype`: the name of the column dtype
+        - `kind`: 'numerical', 'categorical' (object and category columns) or 'other'
+        - `cardinality`: number of distinct non missing values (categorical and numerical columns)
+        - `min`, `max`: for numerical columns
+        - `values`: distinct values in order of appearance, for columns with at most `unique_limit` of them
+    """
+
+    def __init__(self, df, unique_limit=100):
+        """
+        Parameters
+        -----------
+        df: pandas dataframe
+            the parsed node or edge frame
+        unique_limit: int
+            above this cardinality the value set is not kept
+        """
+        self.n_rows = len(df)
+        self.unique_limit = unique_limit
+        self.columns = {}
+        for col in df.columns:
+            values = df[col]
+            info = {'dtype': values.dtype.name}
+            if values.dtype.name in NUMERICS:
+                info['kind'] = 'numerical'
+                # plain python numbers, so that the schema can be serialized
+                info['min'], info['max'] = [getattr(x, 'item', lambda: x)() for x in (values.min(), values.max())]
+            elif values.dtype == 'object' or isinstance(values.dtype, pd.CategoricalDtype):
+                info['kind'] = 'categorical'
+            else:
+                info['kind'] = 'other'
+            if info['kind'] != 'other':
+                try:
+                    uniques = pd.unique(values.dropna().values)
+                except TypeError:
+                    # unhashable values, like dicts
+                    uniques = None
+                if uniques is not None:
+                    info['cardinality'] = len(uniques)
+                    if len(uniques) <= unique_limit:
+                        info['values'] = uniques.tolist()
+            self.columns[col] = info
+
+    def categorical_features(self, unique_limit=None, blacklist_features=()):
+        """Names of the categorical columns with at most `unique_limit` values, plus 'None' first
+        """
+        unique_limit = self.unique_limit if unique_limit is None else unique_limit
+        return ['None'] + [col for col, info in self.columns.items()
+                           if info['kind'] == 'categorical' and info.get('cardinality', unique_limit + 1) <= unique_limit
+                           and col not in blacklist_features]
+
+    def numerical_features(self, blacklist_features=('size',)):
+        """Names of the numerical columns, plus 'None' first
+        """
+        return ['None'] + [col for col, info in self.columns.items()
+                           if info['kind'] == 'numerical' and col not in blacklist_features]
+
+    def scaling(self, col):
+        """min and max of a numerical column"""
+        return self.columns[col]['min'], self.columns[col]['max']
+
+def describe_frames(nodes_df, edges_df, unique_limit=100):
+    """Schema of the parsed node and edge frames, keyed like `scaling_vars`
+    """
+    return {'node': FrameSchema(nodes_df, unique_limit), 'edge': FrameSchema(edges_df, unique_limit)}
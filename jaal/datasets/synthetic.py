@@ -0,0 +1,120 @@
+"""
+Generate synthetic co-authorship networks, with the columns of the publication datasets
+
+Data details:
+1. the nodes are institutions, with their `Country`, `City`, `Country_type` (HIC or LMIC),
+   the authors (`au_list`) and publications (`pmid_list`) and the number of publications (`npub`)
+2. the edges are co-authorships between two institutions in a year (`year-factor`), with
+   the income type of both countries (`edgetype`), whether they are in the same country
+   (`edge_sc`) and the number of co-authored publications (`weight`)
+"""
+
+# imports
+import numpy as np
+import pandas as pd
+
+# Constants
+#--------------
+# countries of the generated institutions, with their income type
+COUNTRIES = [('USA', 'HIC'), ('UK', 'HIC'), ('Germany', 'HIC'), ('France', 'HIC'), ('Canada', 'HIC'),
+             ('Australia', 'HIC'), ('Japan', 'HIC'), ('Netherlands', 'HIC'), ('Sweden', 'HIC'),
+             ('Switzerland', 'HIC'), ('Italy', 'HIC'), ('Spain', 'HIC'), ('China', 'LMIC'), ('India', 'LMIC'),
+             ('Brazil', 'LMIC'), ('South Africa', 'LMIC'), ('Nigeria', 'LMIC'), ('Kenya', 'LMIC'),
+             ('Uganda', 'LMIC'), ('Ghana', 'LMIC'), ('Tanzania', 'LMIC'), ('Ethiopia', 'LMIC'),
+             ('Malawi', 'LMIC'), ('Bangladesh', 'LMIC'), ('Pakistan', 'LMIC'), ('Vietnam', 'LMIC'),
+             ('Peru', 'LMIC'), ('Mexico', 'LMIC'), ('Egypt', 'LMIC'), ('Zambia', 'LMIC')]
+SURNAMES = ['Smith', 'Okafor', 'Mwangi', 'Chen', 'Kumar', 'Garcia', 'Mensah', 'Muller', 'Martin', 'Silva',
+            'Nguyen', 'Ahmed', 'Otieno', 'Brown', 'Wang', 'Singh', 'Rossi', 'Kato', 'Banda', 'Tanaka']
+
+# Code
+#---------
+def _zipf_weights(n, exponent, rng):
+    """Shuffled weights following Zipf's law, for the heavy tailed popularity of countries, cities and nodes"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+def _sample_within(groups, weights, starts, ends, rng):
+    """Sample one row per entry of `groups`, weighted by `weights`, among the rows `starts[g]:ends[g]`
+
+    The rows must be sorted by group.
+    """
+    cumulative = np.concatenate([[0], np.cumsum(weights)])
+    low, high = cumulative[starts[groups]], cumulative[ends[groups]]
+    rows = np.searchsorted(cumulative, low + rng.random(len(groups)) * (high - low), side='right') - 1
+    return np.clip(rows, starts[groups], ends[groups] - 1)
+
+def make_coauthorship(n_edges=10000, n_nodes=None, domestic=0.6, selfloop=0.05, years=(2002, 2022), seed=0):
+    """Create node and edge frames of a random co-authorship network
+
+    The degrees follow a power law, most collaborations happen within the same
+    country, and the number of publications grows over the years. Repeated
+    collaborations in a year are merged in one edge, so there are slightly less
+    than `n_edges` edges.
+
+    Parameters
+    -----------
+    n_edges: int
+        number of collaborations to draw
+    n_nodes: int (optional)
+        number of institutions, a fifth of `n_edges` by default
+    domestic: float
+        share of the collaborations between institutions of the same country
+    selfloop: float
+        share of the collaborations within the same institution
+    years: tuple of int
+        first and last year of the collaborations
+    seed: int
+        seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    n_nodes = n_nodes or max(10, n_edges // 5)
+
+    # institutions sorted by country then city, so every country is a contiguous range of rows
+    names = np.array([name for name, _ in COUNTRIES])
+    types = dict(COUNTRIES)
+    country = np.sort(rng.choice(len(names), n_nodes, p=_zipf_weights(len(names), 1.0, rng)))
+    city = rng.choice(8, n_nodes, p=_zipf_weights(8, 1.2, rng))
+    order = np.lexsort([city, country])
+    country, city = country[order], city[order]
+    activity = rng.pareto(1.5, n_nodes) + 1
+    npub = np.minimum(np.round(activity * 3).astype(int), 500)
+    n_authors = 1 + rng.poisson(4, n_nodes)
+    authors = rng.integers(0, 26 * len(SURNAMES), n_authors.sum())
+    author_names = [f'{SURNAMES[i % len(SURNAMES)]} {chr(65 + i // len(SURNAMES))}' for i in authors]
+    bounds = np.concatenate([[0], np.cumsum(n_authors)])
+    n_pmids = np.minimum(npub, 50)
+    pmids = rng.integers(10**7, 4 * 10**7, n_pmids.sum()).astype(str)
+    pmid_bounds = np.concatenate([[0], np.cumsum(n_pmids)])
+    node_df = pd.DataFrame({
+        'id': np.arange(n_nodes),
+        'Country': names[country],
+        'City': [f'{names[c]} City {k + 1}' for c, k in zip(country, city)],
+        'Country_type': [types[x] for x in names[country]],
+        'au_list': [', '.join(author_names[a:b]) for a, b in zip(bounds[:-1], bounds[1:])],
+        'pmid_list': [','.join(pmids[a:b]) for a, b in zip(pmid_bounds[:-1], pmid_bounds[1:])],
+        'npub': npub,
+    })
+
+    # collaborations, the active institutions take part in more of them
+    weights = activity / activity.sum()
+    src = rng.choice(n_nodes, n_edges, p=weights)
+    starts = np.searchsorted(country, np.arange(len(names)), side='left')
+    ends = np.searchsorted(country, np.arange(len(names)), side='right')
+    kind = rng.random(n_edges)
+    dst = np.where(kind < domestic, _sample_within(country[src], weights, starts, ends, rng),
+                   rng.choice(n_nodes, n_edges, p=weights))
+    dst = np.where(kind > 1 - selfloop, src, dst)
+    first, last = years
+    growth = 1.1 ** np.arange(last - first + 1)
+    year = first + rng.choice(len(growth), n_edges, p=growth / growth.sum())
+    # undirected, and the repeated collaborations of a year are merged
+    edges = pd.DataFrame({'from': np.minimum(src, dst), 'to': np.maximum(src, dst), 'year-factor': year})
+    edge_df = edges.groupby(['from', 'to', 'year-factor']).size().rename('weight').reset_index()
+    from_type = node_df['Country_type'].values[edge_df['from']]
+    to_type = node_df['Country_type'].values[edge_df['to']]
+    edge_df.insert(3, 'edgetype', np.where((from_type == 'LMIC') & (to_type == 'LMIC'), 'LMLM',
+                                           np.where((from_type == 'HIC') & (to_type == 'HIC'), 'HCHC', 'LMHC')))
+    edge_df.insert(4, 'edge_sc', np.where(country[edge_df['from']] == country[edge_df['to']], 'Y', 'N'))
+    # shuffle, like the rows of the real datasets
+    edge_df = edge_df.iloc[rng.permutation(len(edge_df))].reset_index(drop=True)
+    return edge_df, node_df
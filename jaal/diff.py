@@ -0,0 +1,177 @@
+"""
+Send graph updates to the browser as patches of what it already holds
+"""
+# import
+import json
+import uuid
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+try:
+    from dash import Patch
+except ImportError:
+    # dash < 2.9, updates are sent in full
+    Patch = None
+
+# Constants
+#--------------
+# above this share of changed elements the full graph is sent instead of a patch
+MAX_PATCH_RATIO = 0.5
+# settings whose empty values (None, '', [] or 0) all mean the same, and settings whose order does not matter
+OPTIONAL_SETTINGS = ['search_text', 'filter_nodes_text', 'filter_edges_text', 'omit_node_value', 'selfloop_value',
+                     'expanded_groups', 'load_more_clicks']
+UNORDERED_SETTINGS = ['omit_node_value', 'selfloop_value', 'edgestype_value', 'edgessc_value', 'expanded_groups']
+
+# class
+class GraphView:
+    """The rows of the store shown in the browser, with their per-row attributes
+
+    The rows are sorted, which is also the order of the visdcc lists in the browser.
+    The attributes are full length arrays (column -> array), never updated in place.
+    `withheld` counts the visible nodes and edges left out by the render budget.
+    """
+
+    def __init__(self, node_rows, edge_rows, node_attrs=None, edge_attrs=None, withheld=None):
+        self.node_rows = np.asarray(node_rows, dtype=np.int64)
+        self.edge_rows = np.asarray(edge_rows, dtype=np.int64)
+        self.node_attrs = node_attrs or {}
+        self.edge_attrs = edge_attrs or {}
+        self.withheld = withheld or {'nodes': 0, 'edges': 0}
+
+    @property
+    def nbytes(self):
+        """Memory of the rows, for the cache budget (the attributes are shared between views)"""
+        return self.node_rows.nbytes + self.edge_rows.nbytes
+
+    def to_visdcc(self, store):
+        """Materialize the view"""
+        return store.to_visdcc(self.node_rows, self.edge_rows, self.node_attrs, self.edge_attrs)
+
+def diff_rows(old_rows, old_attrs, new_rows, new_attrs):
+    """Compare two sorted row lists and their attributes
+
+    Returns
+    -------
+        removed: array of int
+            positions in the old list to delete
+
+        added: array of int
+            positions in the new list to insert
+
+        changed: array of int
+            positions in the new list of the rows present in both, with different attributes
+    """
+    added = ~np.isin(new_rows, old_rows, assume_unique=True)
+    removed = np.flatnonzero(~np.isin(old_rows, new_rows, assume_unique=True))
+    kept = np.flatnonzero(~added)
+    kept_rows = new_rows[kept]
+    changed = np.zeros(len(kept), dtype=bool)
+    for col in set(old_attrs) | set(new_attrs):
+        old, new = old_attrs.get(col), new_attrs.get(col)
+        if old is new:
+            continue
+        if old is None or new is None:
+            # the attribute appears or disappears on every element
+            changed[:] = True
+            break
+        changed |= np.asarray(old)[kept_rows] != np.asarray(new)[kept_rows]
+    return removed, np.flatnonzero(added), kept[changed]
+
+def graph_patch(store, old_view, new_view):
+    """Create the Dash patch turning the browser data of `old_view` into `new_view`
+
+    Returns None when a patch is not worth it (or not supported) and the full data
+    has to be sent instead.
+    """
+    # only the views of store rows can be diffed
+    if Patch is None or not isinstance(old_view, GraphView) or not isinstance(new_view, GraphView):
+        return None
+    patch = Patch()
+    for key, rows_attr, attrs_attr in [('nodes', 'node_rows', 'node_attrs'), ('edges', 'edge_rows', 'edge_attrs')]:
+        new_rows, new_attrs = getattr(new_view, rows_attr), getattr(new_view, attrs_attr)
+        removed, added, changed = diff_rows(getattr(old_view, rows_attr), getattr(old_view, attrs_attr),
+                                            new_rows, new_attrs)
+        if len(removed) + len(added) + len(changed) > MAX_PATCH_RATIO * max(len(new_rows), 1):
+            return None
+        # materialize only the elements to insert or replace
+        rows = new_rows[np.concatenate([added, changed])]
+        if key == 'nodes':
+            elements = store.to_visdcc(rows, rows[:0], new_attrs, None)['nodes']
+        else:
+            elements = store.to_visdcc(rows[:0], rows, None, new_attrs)['edges']
+        # delete from the end so positions stay valid, then insert in increasing order
+        for position in removed[::-1].tolist():
+            del patch[key][position]
+        for position, element in zip(added.tolist(), elements[:len(added)]):
+            patch[key].insert(position, element)
+        for position, element in zip(changed.tolist(), elements[len(added):]):
+            patch[key][position] = element
+    return patch
+
+def normalize_settings(settings):
+    """Equivalent settings made equal, like the checklist options checked in another order"""
+    settings = dict(settings)
+    for key in OPTIONAL_SETTINGS:
+        if not settings.get(key):
+            settings[key] = None
+    for key in UNORDERED_SETTINGS:
+        if settings.get(key) is not None:
+            settings[key] = sorted(settings[key])
+    return settings
+
+def view_etag(settings):
+    """Short hash identifying the view built from the given settings, equivalent settings share it"""
+    return hashlib.sha1(json.dumps(normalize_settings(settings), sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+class ViewTracker:
+    """Remember the last view sent to every browser session
+
+    Every response carries a new version of the session, a random token, and the browser
+    sends back the version it holds. A patch is only computed when that is the last version
+    sent by this tracker, otherwise (overlapping requests, unknown or evicted session, or a
+    version issued by another server process) the full data is sent, so the browser data
+    can not drift from what the server believes it holds.
+
+    The tracker is shared by all the request threads, every method holds its lock.
+    """
+
+    def __init__(self, max_sessions=100):
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def new_session(self, view):
+        """Register a new browser session holding `view` and return its state"""
+        with self.lock:
+            return self._add(uuid.uuid4().hex, view)
+
+    def get(self, state):
+        """View held by the browser with the given state, if known"""
+        with self.lock:
+            return self._get(state)
+
+    def swap(self, state, view):
+        """Record `view` as sent to the session of `state`
+
+        Returns the view the browser holds (if known) and the new state. Checking and
+        replacing the version is atomic, so of two overlapping requests only one patches.
+        """
+        with self.lock:
+            old_view = self._get(state)
+            session = state['session'] if state and state.get('session') else uuid.uuid4().hex
+            return old_view, self._add(session, view)
+
+    def _get(self, state):
+        if not state or state.get('session') not in self.sessions:
+            return None
+        version, view = self.sessions[state['session']]
+        return view if version == state.get('version') else None
+
+    def _add(self, session, view):
+        version = uuid.uuid4().hex
+        self.sessions[session] = (version, view)
+        self.sessions.move_to_end(session)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return {'session': session, 'version': version}
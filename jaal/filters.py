@@ -0,0 +1,200 @@
+"""
+Evaluate the setting panel filters as boolean masks over the graph store
+"""
+# import
+import numpy as np
+import pandas as pd
+from .cache import LRUCache
+from .query import CompiledQuery
+
+# Constants
+#--------------
+# edge_sc value selected by each option of the cross country checklist
+EDGE_SC_VALUES = {'Cross country edge': 'N', 'Domestic edge': 'Y'}
+# edge columns selected on by the checklists
+CHECKLIST_EDGE_COLUMNS = ['edgetype', 'edge_sc']
+
+# class
+class CategoryBitmaps:
+    """One packed bitmap per value of the categorical columns of a dataframe
+
+    Selecting several values of a column is the OR of their bitmaps. Columns
+    without bitmaps fall back to a scan with `isin`.
+    """
+
+    def __init__(self, df, columns):
+        """
+        Parameters
+        -------------
+        df: pandas dataframe
+            the node or edge data
+
+        columns: list of str
+            the categorical columns to index
+        """
+        self.df = df
+        self.bitmaps = {}
+        for col in columns:
+            codes, uniques = pd.factorize(df[col])
+            self.bitmaps[col] = {value: np.packbits(codes == code) for code, value in enumerate(uniques)}
+
+    def select(self, column, values):
+        """Mask of the rows whose `column` is one of the `values`"""
+        if column not in self.bitmaps:
+            return self.df[column].isin(values).values
+        packed = np.zeros((len(self.df) + 7) // 8, dtype=np.uint8)
+        for value in values:
+            if value in self.bitmaps[column]:
+                packed |= self.bitmaps[column][value]
+        return np.unpackbits(packed, count=len(self.df)).view(bool)
+
+class FilterEngine:
+    """Turn every filter control into a mask over the node or edge rows of a `GraphStore`
+
+    A mask of None means the control does not restrict anything. The masks of all
+    the controls are combined in one pass by `evaluate`.
+    """
+
+    def __init__(self, store, query_cache=None):
+        """
+        Parameters
+        -------------
+        store: GraphStore
+            the graph data to filter
+
+        query_cache: LRUCache (optional)
+            cache of the node/edge query results, shared by all the sessions
+        """
+        self.store = store
+        self.query_cache = LRUCache() if query_cache is None else query_cache
+        # the queries parsed and checked against the columns, ready to run
+        self.compiled_queries = LRUCache(max_items=128)
+        # bitmaps of the categorical edge columns the checklists select on, these never change after load
+        self.edge_bitmaps = CategoryBitmaps(store.edges, [col for col in CHECKLIST_EDGE_COLUMNS if col in store.edges])
+        # without a search every node is shown, one shared array so the views compare as unchanged
+        self.not_hidden = np.zeros(store.n_nodes, dtype=bool)
+        self.not_hidden.flags.writeable = False
+
+    def edges_type(self, edgestype_value):
+        """Keep the edges whose `edgetype` is selected"""
+        if edgestype_value is None:
+            return None
+        return self.edge_bitmaps.select('edgetype', edgestype_value)
+
+    def edges_sc(self, edgessc_value):
+        """Keep the cross country and/or domestic edges"""
+        if edgessc_value is None:
+            return None
+        values = [EDGE_SC_VALUES[option] for option in edgessc_value if option in EDGE_SC_VALUES]
+        return self.edge_bitmaps.select('edge_sc', values)
+
+    def selfloop(self, selfloop_value):
+        """Drop the self-loops if the option is checked"""
+        if not selfloop_value:
+            return None
+        return self.store.edge_src != self.store.edge_dst
+
+    def year_range(self, year_range_value):
+        """Keep the edges within the selected years, the full slider range keeps everything"""
+        if year_range_value is None or tuple(year_range_value) == self.store.year_bounds:
+            return None
+        min_v, max_v = year_range_value
+        print("year from " + str(min_v) + " to " + str(max_v))
+        mask = np.zeros(self.store.n_edges, dtype=bool)
+        mask[self.store.year_slice(min_v, max_v)] = True
+        return mask
+
+    def compile_query(self, kind, text):
+        """Parse and check the node or edge query, raise an Exception if it is invalid"""
+        df = self.store.nodes if kind == 'nodes' else self.store.edges
+        return self.compiled_queries.get_or_compute((kind, text, self.store.version),
+                                                    lambda: CompiledQuery(text, df))
+
+    def query_error(self, kind, text):
+        """Why the node or edge query is invalid, None if it is fine"""
+        if not text:
+            return None
+        try:
+            self.compile_query(kind, text)
+        except Exception as e:
+            return str(e)
+        return None
+
+    def _query_rows(self, kind, text):
+        """Rows of the nodes or edges matching the query, cached per query and data version"""
+        df = self.store.nodes if kind == 'nodes' else self.store.edges
+        query = self.compile_query(kind, text)
+        return self.query_cache.get_or_compute((kind, text, self.store.version),
+                                               lambda: np.flatnonzero(query.mask(df)))
+
+    def filter_nodes(self, filter_nodes_text):
+        """Keep the nodes matching the query"""
+        if not filter_nodes_text:
+            return None
+        mask = np.zeros(self.store.n_nodes, dtype=bool)
+        mask[self._query_rows('nodes', filter_nodes_text)] = True
+        return mask
+
+    def filter_edges(self, filter_edges_text):
+        """Keep the edges matching the query"""
+        if not filter_edges_text:
+            return None
+        mask = np.zeros(self.store.n_edges, dtype=bool)
+        mask[self._query_rows('edges', filter_edges_text)] = True
+        return mask
+
+    def search(self, search_text, edge_mask):
+        """Nodes matching the search text, by their label or one of their (visible) edges"""
+        matched = np.zeros(self.store.n_nodes, dtype=bool)
+        matched[self.store.label_index.search(search_text)] = True
+        matched_edges = np.zeros(self.store.n_edges, dtype=bool)
+        matched_edges[self.store.idd_index.search(search_text)] = True
+        return matched | (self.store.adjacency.degree(matched_edges & edge_mask) > 0)
+
+    def _mask(self, name, message, *args):
+        """Run one control, a failing control restricts nothing"""
+        try:
+            return getattr(self, name)(*args)
+        except:
+            print(message)
+            return None
+
+    def evaluate(self, settings):
+        """Combine all the filter controls
+
+        Parameters
+        -------------
+        settings: dict
+            the value of the controls: `search_text`, `omit_node_value`, `selfloop_value`,
+            `edgestype_value`, `edgessc_value`, `filter_nodes_text`, `filter_edges_text` and
+            `year_range_value`. Missing controls do not filter anything.
+
+        Returns
+        -------
+            node_mask, edge_mask: array of bool
+                the nodes and edges to show
+
+            hidden: array of bool
+                the nodes to hide as they do not match the search text, all False
+                without a search so the nodes hidden by a previous search show again
+        """
+        edge_masks = [
+            self._mask('edges_type', "wrong edge type!!", settings.get('edgestype_value')),
+            self._mask('edges_sc', "wrong edge across country? !!", settings.get('edgessc_value')),
+            self._mask('selfloop', "wrong omit selfloop!!", settings.get('selfloop_value')),
+            self._mask('year_range', "wrong year range !!", settings.get('year_range_value')),
+            self._mask('filter_edges', "wrong edge filter query!!", settings.get('filter_edges_text')),
+        ]
+        node_mask = self._mask('filter_nodes', "wrong node filter query!!", settings.get('filter_nodes_text'))
+        if node_mask is None:
+            node_mask = np.ones(self.store.n_nodes, dtype=bool)
+        # edges need both of their nodes
+        edge_masks.append(node_mask[self.store.edge_src] & node_mask[self.store.edge_dst])
+        edge_mask = np.logical_and.reduce([mask for mask in edge_masks if mask is not None])
+        # derive the node visibility from the surviving edges
+        if settings.get('omit_node_value'):
+            node_mask = node_mask & (self.store.adjacency.degree(edge_mask) > 0)
+        hidden = self.not_hidden
+        if settings.get('search_text'):
+            hidden = ~self.search(settings['search_text'], edge_mask)
+        return node_mask, edge_mask, hidden
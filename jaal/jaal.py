@@ -1,23 +1,45 @@
 # import
+import time
 import dash
-import visdcc
-import pandas as pd
-from dash import dcc, html
-# import dash_core_components as dcc
-# import dash_html_components as html
+import flask
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 from dash.dependencies import Input, Output, State
-from .datasets.parse_dataframe import parse_dataframe
-from .layout import get_app_layout, get_distinct_colors, create_color_legend, DEFAULT_COLOR, DEFAULT_NODE_SIZE, \
-    DEFAULT_EDGE_SIZE
+from .store import GraphStore
+from .filters import FilterEngine
+from .styles import StyleCache
+from .positions import get_positions
+from .aggregate import Aggregator, GROUP_LEVELS, GROUP_PREFIX
+from .budget import RenderBudget, RANK_BY_DEGREE
+from .diff import GraphView, ViewTracker, graph_patch, view_etag
+from .metrics import Metrics, timed, CONTENT_TYPE
+from .cache import LRUCache
+from .payloads import PayloadCache
+from .warmup import WarmUp, checklist_settings, component_values
+from .layout import get_app_layout, create_color_legend
+
+# Constants
+#--------------
+# setting of every input of the main callback, with its component id and property
+SETTING_INPUTS = [('search_text', 'search_graph', 'value'), ('omit_node_value', 'node_omit_input', 'value'),
+                  ('selfloop_value', 'selfloop_omit_input', 'value'), ('edgestype_value', 'edgestype_input', 'value'),
+                  ('edgessc_value', 'edges_sc_input', 'value'), ('filter_nodes_text', 'filter_nodes', 'value'),
+                  ('filter_edges_text', 'filter_edges', 'value'), ('color_nodes_value', 'color_nodes', 'value'),
+                  ('color_edges_value', 'color_edges', 'value'), ('size_nodes_value', 'size_nodes', 'value'),
+                  ('size_edges_value', 'size_edges', 'value'), ('year_range_value', 'year_range', 'value'),
+                  ('level_value', 'level_input', 'value'), ('expanded_groups', 'expanded_groups', 'data'),
+                  ('rank_value', 'rank_input', 'value'), ('load_more_clicks', 'load_more', 'n_clicks')]
+# node columns only shown in the tooltip, left out of the graph data with lazy tooltips
+TOOLTIP_COLUMNS = ['title', 'pmid_list', 'au_list']
+# serves the title of a node, `?id=<node id>`
+TOOLTIP_ROUTE = '/_jaal/tooltip'
 
 # class
 class Jaal:
     """The main visualization class
     """
 
-    def __init__(self, edge_df, node_df=None):
+    def __init__(self, edge_df, node_df=None, cache=False, cache_dir=None, workers=1):
         """
         Parameters
         -------------
@@ -26,302 +48,266 @@ class Jaal:
 
         node_df: pandas dataframe (optional)
             The network node data stored in format of pandas dataframe
+
+        cache: boolean
+            Keep the parsed graph on disk, and load it from there instead of parsing
+            the same data again (default: False). The cached graph is a pickle, only
+            use a cache directory that no untrusted user can write to
+
+        cache_dir: str (optional)
+            Directory of the on-disk caches (default: $JAAL_CACHE_DIR or ~/.cache/jaal)
+
+        workers: int (optional)
+            Processes parsing the data, None for one per CPU (default: 1)
         """
         print("Parsing the data...", end="")
-        self.data, self.scaling_vars = parse_dataframe(edge_df, node_df)
-        self.filtered_data = self.data.copy()
-        self.node_value_color_mapping = {}
-        self.edge_value_color_mapping = {}
+        self._setup(GraphStore.from_dataframe(edge_df, node_df, cache=cache, cache_dir=cache_dir, workers=workers),
+                    cache_dir)
         print("Done")
 
-    def _callback_search_graph(self, graph_data, search_text):
-        """Only show the nodes which match the search text
-        """
-        nodes = graph_data['nodes']
-        edges = graph_data['edges']
-        for node in nodes:
-            if search_text in node['label']:
-                node['hidden'] = False
-            else:
-                edges_node = []
-                for edge in edges:
-                    if str(node['idd']) in edge['idd']:
-                        edges_node.append(edge)
-                if len(edges_node) >= 1:
-                    for edge in edges_node:
-                        if search_text in edge['idd']:
-                            node['hidden'] = False
-                            break
-                        else:
-                            node['hidden'] = True
-                else:
-                    node['hidden'] = True
-            # for edge in edges:
-            #     if str(node['id']) in edge['id']:
-            #         edges_node.append(edge)
-            # for edge in edges_node:
-            #     if search_text in node['label']:
-            #         node['hidden'] = False
-            #         break
-            #     elif search_text in edge['id']:
-            #         node['hidden'] = False
-            #         break
-            #     else:
-            #         node['hidden'] = True
-        graph_data['nodes'] = nodes
-        return graph_data
-
-    def _callback_filter_nodes(self, graph_data, filter_nodes_text):
-        """Filter the nodes based on the Python query syntax
+    @classmethod
+    def from_files(cls, edges_path, nodes_path=None, edge_dtypes=None, node_dtypes=None, chunksize=None,
+                   progress=True, cache=False, cache_dir=None, workers=1):
+        """Create the Jaal of CSV (or parquet) files, read in chunks
+
+        Parameters
+        -------------
+        edges_path: str
+            The network edge data file
+
+        nodes_path: str (optional)
+            The network node data file
+
+        edge_dtypes, node_dtypes: dict (optional)
+            dtype of the columns, the usual columns have sensible defaults
+
+        chunksize: int (optional)
+            rows read at once
+
+        progress: boolean
+            print the progress while reading (default: True)
+
+        cache: boolean
+            Keep the parsed graph on disk, and load it from there as long as the files
+            do not change (default: False). The cached graph is a pickle, only use a
+            cache directory that no untrusted user can write to
+
+        cache_dir: str (optional)
+            Directory of the on-disk caches (default: $JAAL_CACHE_DIR or ~/.cache/jaal)
+
+        workers: int (optional)
+            Processes parsing the data, None for one per CPU (default: 1)
         """
-        self.filtered_data = self.data.copy()
-        node_df = pd.DataFrame(self.filtered_data['nodes'])
-        try:
-            node_list = node_df.query(filter_nodes_text)['id'].tolist()
-            nodes = []
-            for node in self.filtered_data['nodes']:
-                if node['id'] in node_list:
-                    nodes.append(node)
-            self.filtered_data['nodes'] = nodes
-            graph_data = self.filtered_data
-        except:
-            graph_data = self.data
-            print("wrong node filter query!!")
-        return graph_data
-
-    def _callback_filter_edges(self, graph_data, filter_edges_text):
-        """Filter the edges based on the Python query syntax
+        return cls.from_store(GraphStore.from_files(edges_path, nodes_path, edge_dtypes, node_dtypes, chunksize,
+                                                    progress, cache, cache_dir, workers), cache_dir)
+
+    @classmethod
+    def from_store(cls, store, cache_dir=None):
+        """Create the Jaal of an already loaded `GraphStore`
         """
-        self.filtered_data = self.data.copy()
-        edges_df = pd.DataFrame(self.filtered_data['edges'])
-        try:
-            edges_list = edges_df.query(filter_edges_text)['id'].tolist()
-            edges = []
-            for edge in self.filtered_data['edges']:
-                if edge['id'] in edges_list:
-                    edges.append(edge)
-            self.filtered_data['edges'] = edges
-            graph_data = self.filtered_data
-        except:
-            graph_data = self.data
-            print("wrong edge filter query!!")
-        return graph_data
-
-    def _callback_edges_type(self, graph_data, edgestype_value):
-        """Filter the edges based on the Python query syntax
+        jaal = cls.__new__(cls)
+        jaal._setup(store, cache_dir)
+        return jaal
+
+    def _setup(self, store, cache_dir):
+        # the parsed graph is shared by all the sessions and never modified
+        self.store = store
+        self.cache_dir = cache_dir
+        self.scaling_vars = self.store.scaling_vars
+        self.filter_engine = FilterEngine(self.store)
+        # colors and sizes of every column, computed on first use
+        self.styles = StyleCache(self.store)
+        # Country/City supernodes, computed on first use
+        self.aggregator = Aggregator(self.store)
+        # views sent to each browser session
+        self.view_tracker = ViewTracker()
+        # node attributes of every view, like the server side positions
+        self.base_node_attrs = {}
+        # the most nodes and edges sent at once
+        self.budget = RenderBudget(self.store)
+        # views of the settings seen so far, and the JSON of those sent in full
+        self.views = LRUCache(max_items=256)
+        self.payloads = PayloadCache()
+        # views computed ahead, see `warm_up`
+        self.default_settings = None
+        self.warmup = None
+        # latency and sizes of the callbacks, with the hit rates of the caches
+        self.metrics = Metrics()
+        for name, get_cache in [('query', lambda: self.filter_engine.query_cache),
+                                ('compiled_query', lambda: self.filter_engine.compiled_queries),
+                                ('style', lambda: self.styles.cache), ('aggregate', lambda: self.aggregator.cache),
+                                ('view', lambda: self.views), ('payload', lambda: self.payloads.cache)]:
+            self.metrics.watch_cache(name, get_cache)
+        self.metrics.watch_gauge('jaal_sessions', 'Browser sessions whose view is tracked.',
+                                 lambda: len(self.view_tracker.sessions))
+        self.metrics.watch_gauge('jaal_warmup_done', 'Views computed by the warm-up.',
+                                 lambda: self.warmup.done if self.warmup else 0)
+        self.metrics.watch_gauge('jaal_warmup_total', 'Views to compute by the warm-up.',
+                                 lambda: len(self.warmup.settings_list) if self.warmup else 0)
+
+    @property
+    def data(self):
+        """The complete network data in visdcc format
         """
-        self.filtered_data = self.data.copy()
-        edges_df = pd.DataFrame(self.filtered_data['edges'])
-        try:
-            edges = []
-            if 'LMLM' in edgestype_value:
-                edges_list = edges_df.loc[edges_df['edgetype'] == 'LMLM']['id'].tolist()
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-
-            if 'LMHC' in edgestype_value:
-                edges_list = edges_df.loc[edges_df['edgetype'] == 'LMHC']['id'].tolist()
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-
-            if 'HCHC' in edgestype_value:
-                edges_list = edges_df.loc[edges_df['edgetype'] == 'HCHC']['id'].tolist()
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-
-            self.filtered_data['edges'] = edges
-            graph_data = self.filtered_data
-        except:
-            graph_data = self.data
-            print("wrong edge type!!")
-        return graph_data
-
-    def _callback_omit_node_(self, graph_data, omit_node_value):
-        """Filter the edges based on the Python query syntax
+        return self.store.to_visdcc()
+
+    def get_tooltip(self, node_id):
+        """Title of the node with the given id, None if unknown"""
+        rows = self.store.node_rows([node_id])
+        if not len(rows):
+            return None
+        if 'title' not in self.store.nodes:
+            return ''
+        return str(self.store.nodes['title'].iat[rows[0]])
+
+    @timed('render_view')
+    def render_view(self, settings):
+        """Build the view for the given setting panel values
+
+        The view only depends on the base graph and `settings`, so concurrent
+        sessions can render at the same time.
+
+        Parameters
+        -------------
+        settings: dict
+            the setting panel values, keyed like the arguments of `FilterEngine.evaluate`
+            plus `color_nodes_value`, `color_edges_value`, `size_nodes_value`, `size_edges_value`,
+            `level_value` (the level of detail), `expanded_groups` (the supernodes clicked on),
+            `rank_value` (the ranking of the nodes within the render budget) and `load_more_clicks`
+
+        Returns
+        -------------
+            view: GraphView or AggregateView
+                the rows to show with their color/size, or the supernodes at the Country/City level
+
+            node_value_color_mapping, edge_value_color_mapping: dict
+                the color legends
         """
-        self.filtered_data = self.data.copy()
-        edges_df = pd.DataFrame(graph_data['edges'])
-        nodes_df = pd.DataFrame(self.filtered_data['nodes'])
-        try:
-            if len(omit_node_value) >= 1:
-                nodes = []
-                nodes_exist_list = list(set(list(edges_df['from']) + list(edges_df['to'])))
-                for node in self.filtered_data['nodes']:
-                    if node['id'] in nodes_exist_list:
-                        nodes.append(node)
-                self.filtered_data['nodes'] = nodes
-                self.filtered_data['edges'] = graph_data['edges']
-                graph_data = self.filtered_data
-            else:
-                graph_data = graph_data
-
-        except:
-            graph_data = self.data
-            print("wrong omit node? !!")
-        return graph_data
-
-    def _callback_selfloop_omit_(self, graph_data, selfloop_omit):
-        """Filter the edges based on the Python query syntax
+        node_attrs, edge_attrs = dict(self.base_node_attrs), {}
+        node_colors, node_value_color_mapping = self._callback_color_nodes(settings.get('color_nodes_value'))
+        edge_colors, edge_value_color_mapping = self._callback_color_edges(settings.get('color_edges_value'))
+        for attrs, col, values in [(node_attrs, 'color', node_colors),
+                                   (node_attrs, 'size', self._callback_size_nodes(settings.get('size_nodes_value'))),
+                                   (edge_attrs, 'color', edge_colors),
+                                   (edge_attrs, 'width', self._callback_size_edges(settings.get('size_edges_value')))]:
+            if values is not None:
+                attrs[col] = values
+        # aggregated levels of detail are cached per settings
+        level = settings.get('level_value')
+        if level in GROUP_LEVELS:
+            with self.metrics.stage('aggregate'):
+                view = self.aggregator.view(view_etag(settings), level, settings.get('expanded_groups'),
+                                            lambda: self.filter_engine.evaluate(settings), node_attrs, edge_attrs)
+            return view, node_value_color_mapping, edge_value_color_mapping
+        # evaluate all the filters at once
+        with self.metrics.stage('filters'):
+            node_mask, edge_mask, hidden = self.filter_engine.evaluate(settings)
+        node_attrs['hidden'] = hidden
+        # send the top ranked elements, every "load more" adds a batch
+        with self.metrics.stage('budget'):
+            node_rows, edge_rows, withheld = self.budget.apply(node_mask, edge_mask, settings.get('rank_value'),
+                                                               1 + (settings.get('load_more_clicks') or 0))
+        for kind, rows in [('nodes', node_rows), ('edges', edge_rows)]:
+            self.metrics.elements.observe(len(rows) + withheld[kind], kind, 'visible')
+            self.metrics.elements.observe(len(rows), kind, 'sent')
+        view = GraphView(node_rows, edge_rows, node_attrs, edge_attrs, withheld)
+        return view, node_value_color_mapping, edge_value_color_mapping
+
+    def get_view(self, settings):
+        """`render_view` of the settings, cached"""
+        return self.views.get_or_compute((view_etag(settings), self.store.version), lambda: self.render_view(settings))
+
+    def warm_up(self, workers=2, background=True):
+        """Compute the views, and the JSON of their full data, of every combination of the
+        edge type, cross country and self-loop checklists, the other settings at their
+        initial value
+
+        The first changes of these checklists are then a cache lookup. Needs the app
+        to be created first.
+
+        Parameters
+        -------------
+        workers: int
+            threads computing the views at once (default: 2)
+
+        background: boolean
+            return at once, the progress is reported by `self.warmup.status()` and
+            on the metrics (default: True)
+
+        Returns
+        -------
+            warmup: WarmUp
+                the running warm-up
         """
-        self.filtered_data = self.data.copy()
-        edges_df = pd.DataFrame(graph_data['edges'])
-        nodes_df = pd.DataFrame(self.filtered_data['nodes'])
-        try:
-            if len(selfloop_omit)==1:
-                edges_list = edges_df[edges_df['from'] != edges_df['to']]['id'].tolist()
-                print('omit selfloop ok')
-                edges = []
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-                self.filtered_data['edges'] = edges
-                graph_data = self.filtered_data
-            else:
-                graph_data = graph_data
-        except:
-            graph_data = self.data
-            print("wrong omit selfloop!!")
-        return graph_data
-
-    def _callback_edges_sc_(self, graph_data, edgessc_value):
-        """Filter the edges based on the Python query syntax
+        if self.default_settings is None:
+            raise Exception("Create the app before warming it up.")
+
+        def compute(settings):
+            view = self.get_view(settings)[0]
+            self.payloads.get((view_etag(settings), self.store.version), view, self.store)
+
+        print("Warming up...")
+        self.warmup = WarmUp(compute, checklist_settings(self.default_settings), workers,
+                             [self.views, self.payloads.cache])
+        return self.warmup.start(background)
+
+    @staticmethod
+    def get_budget_info(view):
+        """Count of the elements shown and withheld by the render budget
         """
-        self.filtered_data = graph_data.copy()
-        edges_df = pd.DataFrame(self.filtered_data['edges'])
-        try:
-            edges = []
-            if 'Cross country edge' in edgessc_value:
-                edges_list = edges_df.loc[edges_df['edge_sc'] == 'N']['id'].tolist()
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-
-            if 'Domestic edge' in edgessc_value:
-                edges_list = edges_df.loc[edges_df['edge_sc'] == 'Y']['id'].tolist()
-                for edge in self.filtered_data['edges']:
-                    if edge['id'] in edges_list:
-                        edges.append(edge)
-            self.filtered_data['edges'] = edges
-            graph_data = self.filtered_data
-        except:
-            graph_data = self.data
-            print("wrong edge across country? !!")
-        return graph_data
-
-    def _callback_year_range_(self, graph_data, year_range_value):
-        """Filter the edges based on the Python query syntax
+        if not (view.withheld['nodes'] or view.withheld['edges']):
+            return ""
+        return f"Showing {len(view.node_rows)} nodes and {len(view.edge_rows)} edges, " \
+               f"{view.withheld['nodes']} nodes and {view.withheld['edges']} edges withheld"
+
+
+    @timed('callback_color_nodes')
+    def _callback_color_nodes(self, color_nodes_value):
+        """Color of every node for the selected categorical column, with the value -> color mapping
         """
-        self.filtered_data = graph_data.copy()
-        edges_df = pd.DataFrame(self.filtered_data['edges'])
-        min_v = year_range_value[0] + 2002
-        max_v = year_range_value[1] + 2002
-        try:
-            edges_df['year-factor'] = edges_df['year-factor'].astype(int)
-            edges_list = edges_df.loc[( edges_df['year-factor'] >= min_v) &
-                                      ( edges_df['year-factor'] <= max_v)]['id'].tolist()
-            edges_df['year-factor'] = edges_df['year-factor'].astype(str)
-            edges = []
-            for edge in self.filtered_data['edges']:
-                if edge['id'] in edges_list:
-                    edges.append(edge)
-            self.filtered_data['edges'] = edges
-            print("year from " + str(min_v) + " to " + str(max_v))
-            graph_data = self.filtered_data
-        except:
-            graph_data = self.data
-            print("wrong year range !!")
-        return graph_data
-
-    def _callback_color_nodes(self, graph_data, color_nodes_value):
-        value_color_mapping = {}
-        # color option is None, revert back all changes
-        self.data=graph_data
-        if color_nodes_value == 'None':
-            # revert to default color
-            for node in self.data['nodes']:
-                node['color'] = DEFAULT_COLOR
-        else:
+        # nothing selected yet, keep the data as is
+        if color_nodes_value is None:
+            return None, {}
+        if color_nodes_value != 'None':
             print("inside color node", color_nodes_value)
-            unique_values = pd.DataFrame(self.data['nodes'])[color_nodes_value].unique()
-            colors = get_distinct_colors(len(unique_values))
-            value_color_mapping = {x: y for x, y in zip(unique_values, colors)}
-            for node in self.data['nodes']:
-                node['color'] = value_color_mapping[node[color_nodes_value]]
-        # filter the data currently shown
-        filtered_nodes = [x['id'] for x in self.filtered_data['nodes']]
-        self.filtered_data['nodes'] = [x for x in self.data['nodes'] if x['id'] in filtered_nodes]
-        graph_data = self.filtered_data
-        return graph_data, value_color_mapping
-
-    def _callback_size_nodes(self, graph_data, size_nodes_value):
-        self.data = graph_data
-        # color option is None, revert back all changes
-        if size_nodes_value == 'None':
-            # revert to default color
-            for node in self.data['nodes']:
-                node['size'] = DEFAULT_NODE_SIZE
-        else:
+        # color option is None, the default color
+        return self.styles.colors('nodes', color_nodes_value)
+
+    @timed('callback_size_nodes')
+    def _callback_size_nodes(self, size_nodes_value):
+        """Size of every node for the selected numerical column
+        """
+        # nothing selected yet, keep the data as is
+        if size_nodes_value is None:
+            return None
+        if size_nodes_value != 'None':
             print("Modifying node size using ", size_nodes_value)
-            # fetch the scaling value
-            minn = self.scaling_vars['node'][size_nodes_value]['min']
-            maxx = self.scaling_vars['node'][size_nodes_value]['max']
-            # define the scaling function
-            scale_val = lambda x: 20 * (x - minn) / (maxx - minn)
-            # set size after scaling
-            for node in self.data['nodes']:
-                node['size'] = node['size'] + scale_val(node[size_nodes_value])
-        # filter the data currently shown
-        filtered_nodes = [x['id'] for x in self.filtered_data['nodes']]
-        self.filtered_data['nodes'] = [x for x in self.data['nodes'] if x['id'] in filtered_nodes]
-        graph_data = self.filtered_data
-        return graph_data
-
-    def _callback_color_edges(self, graph_data, color_edges_value):
-        value_color_mapping = {}
-        # color option is None, revert back all changes
-        self.data=graph_data
-        if color_edges_value == 'None':
-            # revert to default color
-            for edge in self.data['edges']:
-                edge['color']['color'] = DEFAULT_COLOR
-        else:
+        # size option is None, the default size
+        return self.styles.sizes('nodes', size_nodes_value)
+
+    @timed('callback_color_edges')
+    def _callback_color_edges(self, color_edges_value):
+        """Color of every edge for the selected categorical column, with the value -> color mapping
+        """
+        # nothing selected yet, keep the data as is
+        if color_edges_value is None:
+            return None, {}
+        if color_edges_value != 'None':
             print("inside color edge", color_edges_value)
-            unique_values = pd.DataFrame(self.data['edges'])[color_edges_value].unique()
-            colors = get_distinct_colors(len(unique_values))
-            value_color_mapping = {x: y for x, y in zip(unique_values, colors)}
-            for edge in self.data['edges']:
-                edge['color']['color'] = value_color_mapping[edge[color_edges_value]]
-        # filter the data currently shown
-        filtered_edges = [x['id'] for x in self.filtered_data['edges']]
-        self.filtered_data['edges'] = [x for x in self.data['edges'] if x['id'] in filtered_edges]
-        graph_data = self.filtered_data
-        return graph_data, value_color_mapping
-
-    def _callback_size_edges(self, graph_data, size_edges_value):
-        # color option is None, revert back all changes
-        self.data = graph_data
-        if size_edges_value == 'None':
-            # revert to default color
-            for edge in self.data['edges']:
-                edge['width'] = DEFAULT_EDGE_SIZE
-        else:
+        # color option is None, the default color
+        return self.styles.colors('edges', color_edges_value)
+
+    @timed('callback_size_edges')
+    def _callback_size_edges(self, size_edges_value):
+        """Width of every edge for the selected numerical column
+        """
+        # nothing selected yet, keep the data as is
+        if size_edges_value is None:
+            return None
+        if size_edges_value != 'None':
             print("Modifying edge size using ", size_edges_value)
-            # fetch the scaling value
-            minn = self.scaling_vars['edge'][size_edges_value]['min']
-            maxx = self.scaling_vars['edge'][size_edges_value]['max']
-            # define the scaling function
-            scale_val = lambda x: 20 * (x - minn) / (maxx - minn)
-            # set the size after scaling
-            for edge in self.data['edges']:
-                edge['width'] = scale_val(edge[size_edges_value])
-        # filter the data currently shown
-        filtered_edges = [x['id'] for x in self.filtered_data['edges']]
-        self.filtered_data['edges'] = [x for x in self.data['edges'] if x['id'] in filtered_edges]
-        graph_data = self.filtered_data
-        return graph_data
+        # size option is None, the default width
+        return self.styles.sizes('edges', size_edges_value)
 
     def get_color_popover_legend_children(self, node_value_color_mapping={}, edge_value_color_mapping={}):
         """Get the popover legends for node and edge based on the color setting
@@ -352,7 +338,8 @@ class Jaal:
         #
         return popover_legend_children
 
-    def create(self, directed=False, vis_opts=None):
+    def create(self, directed=False, vis_opts=None, server_layout=False, max_nodes=None, max_edges=None,
+               warm_up=False, lazy_tooltips=False):
         """Create the Jaal app and return it
 
         Parameter
@@ -363,6 +350,23 @@ class Jaal:
             vis_opts: dict
                 the visual options to be passed to the dash server (default: None)
 
+            server_layout: boolean
+                position the nodes on the server (cached on disk) and disable the
+                browser physics, filtered views keep the node positions (default: False)
+
+            max_nodes, max_edges: int
+                the most nodes and edges sent at once, the highest ranked ones are
+                shown first and "Load more" sends the next ones, None for no limit
+                (default: None)
+
+            warm_up: boolean
+                compute the views of the checklist filter combinations in the background,
+                see `warm_up` (default: False)
+
+            lazy_tooltips: boolean
+                send the nodes without their title and the columns only shown in it, the
+                browser fetches the title of a node when hovered (default: False)
+
         Returns
         -------
             app: dash.Dash
@@ -372,9 +376,38 @@ class Jaal:
         app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP,
                                               'https://cdnjs.cloudflare.com/ajax/libs/vis/4.20.1/vis.min.css'])
 
-        # define layout
-        app.layout = get_app_layout(self.data, color_legends=self.get_color_popover_legend_children(),
-                                    directed=directed, vis_opts=vis_opts)
+        # position the nodes once, the browser only draws them
+        if server_layout:
+            x, y = get_positions(self.store, cache_dir=self.cache_dir)
+            self.base_node_attrs = {'x': x, 'y': y}
+            vis_opts = {'physics': {'enabled': False}, 'layout': {'improvedLayout': False}, **(vis_opts or {})}
+        else:
+            self.base_node_attrs = {}
+        if lazy_tooltips:
+            self.base_node_attrs.update(dict.fromkeys(col for col in TOOLTIP_COLUMNS if col in self.store.nodes))
+
+        # the tooltip route follows the path prefixes of the app (`url_base_pathname` and co.)
+        tooltip_route = app.config.routes_pathname_prefix + TOOLTIP_ROUTE.lstrip('/')
+
+        # define layout, the view every browser starts with
+        self.budget = RenderBudget(self.store, max_nodes, max_edges)
+        initial_view, _, _ = self.render_view({})
+        app.layout = get_app_layout(initial_view.to_visdcc(self.store), color_legends=self.get_color_popover_legend_children(),
+                                    directed=directed, vis_opts=vis_opts,
+                                    year_bounds=self.store.year_bounds or (2002, 2022), schema=self.store.schema,
+                                    levels=Aggregator.levels(self.store.nodes.columns),
+                                    rank_options=[RANK_BY_DEGREE] + self.store.schema['node'].numerical_features()[1:],
+                                    budget_info=self.get_budget_info(initial_view),
+                                    tooltip_url=f'{app.get_relative_path(TOOLTIP_ROUTE)}?id=' if lazy_tooltips else None)
+        # the views depend on the positions, budget and tooltips, drop those of a previous app
+        self.views.clear()
+        self.payloads.clear()
+        self.aggregator.cache.clear()
+        # the settings sent by a browser which did not change anything yet
+        values = component_values(app.layout, [(component, prop) for _, component, prop in SETTING_INPUTS])
+        self.default_settings = {key: values[(component, prop)] for key, component, prop in SETTING_INPUTS}
+        if warm_up:
+            self.warm_up()
 
         # create callbacks to toggle legend popover
         @app.callback(
@@ -420,84 +453,127 @@ class Jaal:
                 return not is_open
             return is_open
 
-        # create the main callbacks
+        # create callbacks to check the filter queries before they run
+        @app.callback(
+            [Output('filter_nodes', 'invalid'), Output('filter_nodes_feedback', 'children')],
+            [Input('filter_nodes', 'value')],
+        )
+        def check_filter_nodes(filter_nodes_text):
+            error = self.filter_engine.query_error('nodes', filter_nodes_text)
+            return error is not None, error
+
+        @app.callback(
+            [Output('filter_edges', 'invalid'), Output('filter_edges_feedback', 'children')],
+            [Input('filter_edges', 'value')],
+        )
+        def check_filter_edges(filter_edges_text):
+            error = self.filter_engine.query_error('edges', filter_edges_text)
+            return error is not None, error
+
+        # create callbacks to expand the supernodes clicked on, changing the level collapses them all
         @app.callback(
-            [Output('graph', 'data'), Output('color-legend-popup', 'children')],
-            [Input('search_graph', 'value'),
-             Input('node_omit_input', 'value'),
-             Input('selfloop_omit_input', 'value'),
-             Input('edgestype_input', 'value'),
-             Input('edges_sc_input', 'value'),
-             Input('filter_nodes', 'value'),
-             Input('filter_edges', 'value'),
-             Input('color_nodes', 'value'),
-             Input('color_edges', 'value'),
-             Input('size_nodes', 'value'),
-             Input('size_edges', 'value'),
-             Input('year_range', 'value')],
-            [State('graph', 'data')]
+            Output('expanded_groups', 'data'),
+            [Input('graph', 'selection'), Input('level_input', 'value')],
+            [State('expanded_groups', 'data')]
         )
-        def setting_pane_callback(search_text, omit_node_value, selfloop_value, edgestype_value,
-                                  edgessc_value, filter_nodes_text, filter_edges_text, color_nodes_value,
-                                  color_edges_value, size_nodes_value, size_edges_value,
-                                  year_range_value, graph_data):
-            # fetch the id of option which triggered
+        def expand_groups(selection, level_value, expanded_groups):
             ctx = dash.callback_context
-            # if its the first call
-            if not ctx.triggered:
-                print("No trigger")
-                return [self.data, self.get_color_popover_legend_children()]
-            else:
-                # find the id of the option which was triggered
-                input_id = ctx.triggered[0]['prop_id'].split('.')[0]
-
-                if len(edgestype_value) <= 3:
-                    graph_data = self._callback_edges_type(graph_data, edgestype_value)
-                if len(edgessc_value) <= 2:
-                    graph_data = self._callback_edges_sc_(graph_data, edgessc_value)
-                # perform operation in case of search graph option
-                if input_id == "search_graph":
-                    graph_data = self._callback_search_graph(graph_data, search_text)
-                # In case filter nodes was triggered
-                if input_id == 'filter_nodes':
-                    graph_data = self._callback_filter_nodes(graph_data, filter_nodes_text)
-                # In case filter edges was triggered
-                if input_id == 'filter_edges':
-                    graph_data = self._callback_filter_edges(graph_data, filter_edges_text)
-                # If color node text is provided
-                if input_id == 'color_nodes':
-                    graph_data, self.node_value_color_mapping = self._callback_color_nodes(graph_data,
-                                                                                           color_nodes_value)
-                # If color edge text is provided
-                if input_id == 'color_edges':
-                    graph_data, self.edge_value_color_mapping = self._callback_color_edges(graph_data,
-                                                                                           color_edges_value)
-                # If size node text is provided
-                if input_id == 'size_nodes':
-                    graph_data = self._callback_size_nodes(graph_data, size_nodes_value)
-                # If size edge text is provided
-                if input_id == 'size_edges':
-                    graph_data = self._callback_size_edges(graph_data, size_edges_value)
-                if selfloop_value is not None:
-                    graph_data = self._callback_selfloop_omit_(graph_data, selfloop_value)
-                if (year_range_value[1]-year_range_value[0])!=20:
-                    graph_data = self._callback_year_range_(graph_data, year_range_value)
-
-                if omit_node_value is not None:
-                    graph_data = self._callback_omit_node_(graph_data, omit_node_value)
-
-
-
-            # create the color legend childrens
-            color_popover_legend_children = self.get_color_popover_legend_children(self.node_value_color_mapping,
-                                                                                   self.edge_value_color_mapping)
-            # finally return the modified data
-            return [graph_data, color_popover_legend_children]
+            if not ctx.triggered or ctx.triggered[0]['prop_id'] == 'level_input.value':
+                return []
+            clicked = [x for x in (selection or {}).get('nodes', []) if str(x).startswith(GROUP_PREFIX)]
+            if not clicked:
+                raise PreventUpdate
+            return sorted(set(expanded_groups or []) | set(clicked))
+
+        # create the main callbacks
+        @app.callback(
+            [Output('graph', 'data'), Output('color-legend-popup', 'children'), Output('view_state', 'data'),
+             Output('budget_info', 'children')],
+            [Input(component, prop) for _, component, prop in SETTING_INPUTS],
+            [State('view_state', 'data')]
+        )
+        def setting_pane_callback(*values):
+            with self.metrics.stage('setting_pane_callback'):
+                # fetch the id of option which triggered
+                ctx = dash.callback_context
+                # the view is fully described by the settings, the graph itself stays on the server
+                settings = {key: value for (key, _, _), value in zip(SETTING_INPUTS, values)}
+                view_state = values[-1]
+                # "load more" pages through the current filters, its clicks count from the last change of the others
+                clicks = settings['load_more_clicks'] or 0
+                load_more_base = (view_state or {}).get('load_more_base', clicks)
+                previous = (view_state or {}).get('settings')
+                if previous is not None and view_etag({**previous, 'load_more_clicks': None}) != \
+                        view_etag({**settings, 'load_more_clicks': None}):
+                    load_more_base = clicks
+                settings['load_more_clicks'] = clicks - load_more_base
+                etag = view_etag(settings)
+                # if its the first call
+                if not ctx.triggered:
+                    print("No trigger")
+                    # the browser already holds the initial view from the layout
+                    return [dash.no_update, self.get_color_popover_legend_children(),
+                            {**self.view_tracker.new_session(initial_view), 'etag': etag, 'settings': settings,
+                             'load_more_base': load_more_base},
+                            self.get_budget_info(initial_view)]
+                # nothing changed since the last view sent
+                if view_state and view_state.get('etag') == etag and self.view_tracker.get(view_state) is not None:
+                    raise PreventUpdate
+                # build the view of the settings, and send the changes w.r.t. what the browser
+                # holds, or everything if unknown
+                view, node_value_color_mapping, edge_value_color_mapping = self.get_view(settings)
+                old_view, view_state = self.view_tracker.swap(view_state, view)
+                with self.metrics.stage('diff'):
+                    graph_data = graph_patch(self.store, old_view, view)
+                    self.metrics.updates.inc('full' if graph_data is None else 'patch')
+                    if graph_data is None:
+                        # serialized once per view, and spliced in the response
+                        graph_data = self.payloads.placeholder(
+                            self.payloads.get((etag, self.store.version), view, self.store))
+
+                # create the color legend childrens
+                color_popover_legend_children = self.get_color_popover_legend_children(node_value_color_mapping,
+                                                                                       edge_value_color_mapping)
+                # finally return the modified data
+                return [graph_data, color_popover_legend_children,
+                        {**view_state, 'etag': etag, 'settings': settings, 'load_more_base': load_more_base},
+                        self.get_budget_info(view)]
+
+        # time the callback requests, serialization included, and expose the metrics
+        @app.server.before_request
+        def start_timer():
+            flask.g.jaal_start = time.perf_counter()
+
+        @app.server.after_request
+        def record_request(response):
+            path = flask.request.path
+            if path.startswith('/_dash-update-component'):
+                response = self.payloads.splice(response)
+                self.metrics.requests.observe(time.perf_counter() - flask.g.jaal_start, path)
+                self.metrics.payloads.observe(flask.request.content_length or 0, path, 'in')
+                self.metrics.payloads.observe(response.calculate_content_length() or 0, path, 'out')
+            elif path == tooltip_route:
+                self.metrics.requests.observe(time.perf_counter() - flask.g.jaal_start, path)
+            return response
+
+        @app.server.route('/metrics')
+        def metrics():
+            return flask.Response(self.metrics.render(), content_type=CONTENT_TYPE)
+
+        @app.server.route(tooltip_route)
+        def tooltip():
+            title = self.get_tooltip(flask.request.args.get('id', ''))
+            if title is None:
+                flask.abort(404)
+            # the graph does not change while the server runs
+            return flask.Response(title, content_type='text/html; charset=utf-8',
+                                  headers={'Cache-Control': 'max-age=3600'})
 
         # return server
         return app
 
-    def plot(self, debug=False, host="127.0.0.2", port="8060", directed=False, vis_opts=None):
+    def plot(self, debug=False, host="127.0.0.2", port="8060", directed=False, vis_opts=None, server_layout=False,
+             max_nodes=None, max_edges=None, warm_up=False, lazy_tooltips=False):
         """Plot the Jaal by first creating the app and then hosting it on default server
 
         Parameter
@@ -516,8 +592,22 @@ class Jaal:
 
             vis_opts: dict
                 the visual options to be passed to the dash server (default: None)
+
+            server_layout: boolean
+                position the nodes on the server instead of the browser (default: False)
+
+            max_nodes, max_edges: int
+                the most nodes and edges sent at once, None for no limit (default: None)
+
+            warm_up: boolean
+                compute the views of the checklist filter combinations in the background (default: False)
+
+            lazy_tooltips: boolean
+                fetch the node titles when hovered instead of sending them with the graph (default: False)
         """
         # call the create_graph function
-        app = self.create(directed=directed, vis_opts=vis_opts)
+        app = self.create(directed=directed, vis_opts=vis_opts, server_layout=server_layout,
+                          max_nodes=max_nodes, max_edges=max_edges, warm_up=warm_up,
+                          lazy_tooltips=lazy_tooltips)
         # run the server
         app.run_server(debug=debug, host=host, port=port)
\ No newline at end of file
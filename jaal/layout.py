@@ -3,15 +3,15 @@ Layout code for the application
 """
 # Import
 #---------
-import os
+import json
 import visdcc
-import base64
+import colorsys
 import pandas as pd
 from dash import dcc, html
 # import dash_core_components as dcc
 # import dash_html_components as html
 import dash_bootstrap_components as dbc
-import jaal
+from .datasets.schema import describe_frames
 
 # Constants
 #--------------
@@ -22,6 +22,28 @@ DEFAULT_EDGE_SIZE = 1
 # default node and egde color
 DEFAULT_COLOR = '#97C2FC'
 
+# columns never offered as categorical features
+NODE_FEATURE_BLACKLIST = ['shape', 'label', 'id']
+EDGE_FEATURE_BLACKLIST = ['color', 'from', 'to', 'id', 'year']
+
+# run by the graph component (`this`) once mounted, fetches the title of a hovered node
+# sent without one from `tooltip_url`, and keeps it in the node data of the browser
+LAZY_TOOLTIP_JS = """
+var graph = this;
+(function hook() {
+    if (!graph.net) { return setTimeout(hook, 50); }
+    if (graph.jaalTooltips) { return; }
+    graph.jaalTooltips = true;
+    graph.net.on('hoverNode', function (params) {
+        var node = graph.nn.get(params.node);
+        if (!node || node.title !== undefined) { return; }
+        fetch(%s + encodeURIComponent(params.node))
+            .then(function (response) { return response.ok ? response.text() : undefined; })
+            .then(function (title) { if (title !== undefined) { graph.nn.update({id: params.node, title: title}); } });
+    });
+})();
+"""
+
  # Taken from https://stackoverflow.com/questions/470690/how-to-automatically-generate-n-distinct-colors
 KELLY_COLORS_HEX = [
     "#FF4A46", "#008941", "#006FA6", "#1CE6FF", "#FFFF00", "#FF34FF", "#A30059",
@@ -83,7 +105,7 @@ def get_options(directed, opts_args):
     return opts
 
 def get_distinct_colors(n):
-    """Return distict colors, currently atmost 20
+    """Return distict colors, the Kelly colors first then generated ones
 
     Parameters
     -----------
@@ -92,8 +114,15 @@ def get_distinct_colors(n):
     """
     if n <= 2:
         return KELLY_COLORS_HEX[3:5]
-    elif n <= 100:
+    elif n <= len(KELLY_COLORS_HEX):
         return KELLY_COLORS_HEX[:n]
+    # step the hue by the golden ratio and cycle the saturation/value, so the
+    # generated colors stay apart from each other
+    colors = list(KELLY_COLORS_HEX)
+    for i in range(n - len(KELLY_COLORS_HEX)):
+        r, g, b = colorsys.hsv_to_rgb((i * 0.618033988749895) % 1, 0.45 + 0.15 * (i % 4), 0.95 - 0.2 * (i // 4 % 3))
+        colors.append('#%02X%02X%02X' % (round(r * 255), round(g * 255), round(b * 255)))
+    return colors
 
 def create_card(id, value, description):
     """Creates card for high level stats
@@ -138,6 +167,7 @@ search_form = dbc.FormGroup(
 filter_node_form = dbc.FormGroup([
     # dbc.Label("Filter nodes", html_for="filter_nodes"),
     dbc.Textarea(id="filter_nodes", placeholder="Enter filter node query here..."),
+    dbc.FormFeedback(id="filter_nodes_feedback"),
     dbc.FormText(
         html.P([
             "Filter on nodes properties by using ",
@@ -151,6 +181,7 @@ filter_node_form = dbc.FormGroup([
 filter_edge_form = dbc.FormGroup([
     # dbc.Label("Filter edges", html_for="filter_edges"),
     dbc.Textarea(id="filter_edges", placeholder="Enter filter edge query here..."),
+    dbc.FormFeedback(id="filter_edges_feedback"),
     dbc.FormText(
         html.P([
             "Filter on edges properties by using ",
@@ -184,37 +215,14 @@ def get_select_form_layout(id, options, label, description):
                 dbc.FormText(description, color="secondary",)
             ,])
 
-def get_categorical_features(df_, unique_limit=100, blacklist_features=['shape', 'label', 'id']):
-    """Identify categorical features for edge or node data and return their names
-    Additional logics: (1) cardinality should be within `unique_limit`, (2) remove blacklist_features
+def get_year_marks(min_year, max_year, max_marks=11):
+    """Marks of the year range slider, at most `max_marks` evenly spaced years
     """
-    # identify the rel cols + None
-    cat_features = ['None'] + df_.columns[(df_.dtypes == 'object') & (df_.apply(pd.Series.nunique) <= unique_limit)].tolist()
-    # remove irrelevant cols
-    try:
-        for col in blacklist_features:
-            cat_features.remove(col)
-    except:
-        pass
-    # return
-    return cat_features
+    step = max(1, -(-(max_year - min_year) // (max_marks - 1)))
+    return {year: str(year) for year in range(min_year, max_year + 1, step)}
 
-def get_numerical_features(df_, unique_limit=100):
-    """Identify numerical features for edge or node data and return their names
-    """
-    # supported numerical cols
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
-    # identify numerical features
-    numeric_features = ['None'] + df_.select_dtypes(include=numerics).columns.tolist()
-    # remove blacklist cols (for nodes)
-    try:
-        numeric_features.remove('size')
-    except:
-        pass
-    # return
-    return numeric_features
-
-def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None):
+def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None, year_bounds=(2002, 2022), schema=None,
+                   levels=[], rank_options=['Degree'], budget_info="", tooltip_url=None):
 
     # """Create and return the layout of the app
     #
@@ -222,38 +230,41 @@ def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None):
     # --------------
     # graph_data: dict{nodes, edges}
     #     network data in format of visdcc
+    # year_bounds: tuple
+    #     first and last year of the year range slider
+    # schema: dict{node, edge} (optional)
+    #     `FrameSchema` of the nodes and edges, described from graph_data if None
+    # levels: list of str
+    #     the levels of detail the nodes can be grouped at
+    # rank_options: list of str
+    #     how the nodes can be ranked within the render budget
+    # budget_info: str
+    #     count of the elements withheld from graph_data by the render budget
+    # tooltip_url: str (optional)
+    #     url the node titles are fetched from on hover, followed by the node id,
+    #     for the nodes of graph_data sent without title
     # """
+    if schema is None:
+        schema = describe_frames(pd.DataFrame(graph_data['nodes']),
+                                 pd.DataFrame(graph_data['edges']).drop(columns=['color'], errors='ignore'))
     # Step 1-2: find categorical features of nodes and edges
-    cat_node_features = get_categorical_features(pd.DataFrame(graph_data['nodes']), 100, ['shape', 'label', 'id'])
-    cat_edge_features = get_categorical_features(pd.DataFrame(graph_data['edges']).drop(columns=['color']), 100, ['color', 'from', 'to', 'id','year'])
+    cat_node_features = schema['node'].categorical_features(100, NODE_FEATURE_BLACKLIST)
+    cat_edge_features = schema['edge'].categorical_features(100, EDGE_FEATURE_BLACKLIST)
     # Step 3-4: Get numerical features of nodes and edges
-    num_node_features = get_numerical_features(pd.DataFrame(graph_data['nodes']))
-    num_edge_features = get_numerical_features(pd.DataFrame(graph_data['edges']))
+    num_node_features = schema['node'].numerical_features()
+    num_edge_features = schema['edge'].numerical_features()
     # Step 5: create and return the layout
-    # resolve path
-    this_dir, _ = os.path.split(__file__)
-    image_filename = os.path.join(this_dir, "assest", "logo.png")
-    encoded_image = base64.b64encode(open(image_filename, 'rb').read())
     return html.Div([
             create_row(html.H2(children="Multiple myeloma in the Sub-Saharan")), # Title
-            dcc.RangeSlider(0, 20, 1,
-                       value=[0,20],
-                       marks={
-                           0: '2002',
-                           2: '2004',
-                           4: '2006',
-                           6: '2008',
-                           8: '2010',
-                           10: '2012',
-                           12: '2014',
-                           14: '2016',
-                           16: '2018',
-                           18: '2020',
-                           20: '2022',
-                       },
+            dcc.RangeSlider(year_bounds[0], year_bounds[1], 1,
+                       value=list(year_bounds),
+                       marks=get_year_marks(*year_bounds),
                        id='year_range'
             ),
-            # create_row(html.Img(src='data:image/png;base64,{}'.format(encoded_image.decode()), width="80px")),
+            # settings and version of the graph view held by the browser
+            dcc.Store(id='view_state'),
+            # the supernodes expanded by a click
+            dcc.Store(id='expanded_groups', data=[]),
             create_row([
                 dbc.Col([
                     # setting panel
@@ -273,6 +284,13 @@ def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None):
                         html.H6("Search"),
                         html.Hr(className="my-2"),
                         search_form,
+                        # ---- level of detail section ----
+                        get_select_form_layout(
+                            id='level_input',
+                            options=[{'label': opt, 'value': opt} for opt in ['Node'] + levels],
+                            label='Group nodes by',
+                            description='Aggregate the nodes by Country or City, click a group to expand it'
+                        ),
                         # ---- filter section ----
                         create_row([
                             html.H6("Filter"),
@@ -380,6 +398,20 @@ def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None):
                             ),
                         ], id="size-show-toggle", is_open=False),
 
+                        # ---- render budget section ----
+                        html.H6("Render"),
+                        html.Hr(className="my-2"),
+                        get_select_form_layout(
+                            id='rank_input',
+                            options=[{'label': opt, 'value': opt} for opt in rank_options],
+                            label='Show first by',
+                            description='The highest ranked nodes are shown first when the graph is too large'
+                        ),
+                        create_row([
+                            dbc.FormText(budget_info, id='budget_info', color="secondary"),
+                            dbc.Button("Load more", id="load_more", outline=True, color="secondary", size="sm"),
+                        ], {**fetch_flex_row_style(), 'margin-left': 0, 'margin-right':0, 'justify-content': 'space-between'}),
+
                     ], className="card", style={'padding': '5px', 'background': '#e5e5e5'}),
                 ],width=3, style={'display': 'flex', 'justify-content': 'center', 'align-items': 'center'}),
                 # graph
@@ -387,7 +419,8 @@ def get_app_layout(graph_data, color_legends=[], directed=False, vis_opts=None):
                     visdcc.Network(
                         id = 'graph',
                         data = graph_data,
-                        options = get_options(directed,vis_opts)
+                        options = get_options(directed,vis_opts),
+                        run = LAZY_TOOLTIP_JS % json.dumps(tooltip_url) if tooltip_url else ''
                     ),
                         width=9,
 
@@ -0,0 +1,158 @@
+"""
+Latency and size histograms of the callbacks, exposed in the Prometheus text format
+"""
+# import
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Constants
+#--------------
+# upper bounds of the histogram buckets, in seconds, bytes and number of elements
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7)
+COUNT_BUCKETS = (10, 100, 1000, 2000, 5000, 10000, 100000, 1000000)
+# content type of the Prometheus text format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Code
+#---------
+def _labels(names, values):
+    """Prometheus label set, like `{stage="filters"}`"""
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+def _sorted(series):
+    """Items of the series sorted by label values"""
+    return sorted(series.items(), key=lambda item: tuple(map(str, item[0])))
+
+# class
+class Histogram:
+    """Cumulative histogram per label values, like the Prometheus client ones
+
+    Recording a value is a bisect and a few additions under a lock, so it can stay
+    enabled on the hot paths.
+    """
+
+    def __init__(self, name, description, buckets, labels=()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> (count per bucket, plus the overflow), sum, count
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = [(values, list(counts), total, count) for values, (counts, total, count) in _sorted(self.series)]
+        for values, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), values + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, values)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labels, values)} {count}')
+        return lines
+
+class Counter:
+    """Monotonic count per label values"""
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = _sorted(self.series)
+        lines.extend(f'{self.name}{_labels(self.labels, values)} {count}' for values, count in series)
+        return lines
+
+class Metrics:
+    """The metrics of a Jaal app
+
+    Records the latency of every stage of the callbacks, the size of the views and
+    of the responses, and reads the hit rates of the caches when rendered.
+    """
+
+    def __init__(self):
+        self.stages = Histogram('jaal_stage_seconds', 'Latency of the callback stages.', LATENCY_BUCKETS, ['stage'])
+        self.requests = Histogram('jaal_request_seconds', 'Latency of the HTTP requests, serialization included.',
+                                  LATENCY_BUCKETS, ['path'])
+        self.payloads = Histogram('jaal_payload_bytes', 'Size of the callback requests and responses.',
+                                  BYTES_BUCKETS, ['path', 'direction'])
+        self.elements = Histogram('jaal_view_elements', 'Nodes and edges of the views, visible and sent.',
+                                  COUNT_BUCKETS, ['kind', 'stage'])
+        self.updates = Counter('jaal_graph_updates_total', 'Graph updates sent, as patches or in full.', ['kind'])
+        # name -> function returning the LRUCache, as the caches can be replaced
+        self.caches = {}
+        # name -> function returning the current value
+        self.gauges = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Record the latency of the `with` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(time.perf_counter() - start, name)
+
+    def watch_cache(self, name, get_cache):
+        """Report the stats of the cache returned by `get_cache()`"""
+        self.caches[name] = get_cache
+
+    def watch_gauge(self, name, description, get_value):
+        """Report the value returned by `get_value()`"""
+        self.gauges[name] = (description, get_value)
+
+    def render(self):
+        """All the metrics in the Prometheus text format"""
+        lines = []
+        for metric in [self.stages, self.requests, self.payloads, self.elements, self.updates]:
+            lines.extend(metric.render())
+        stats = {name: get_cache().stats() for name, get_cache in self.caches.items()}
+        for key, kind, description in [('hits', 'counter', 'Cache hits.'), ('misses', 'counter', 'Cache misses.'),
+                                       ('evictions', 'counter', 'Cache evictions.'),
+                                       ('hit_rate', 'gauge', 'Share of the cache lookups that hit.'),
+                                       ('items', 'gauge', 'Entries in the cache.'),
+                                       ('bytes', 'gauge', 'Approximate memory used by the cache.')]:
+            name = f'jaal_cache_{key}' + ('_total' if kind == 'counter' else '')
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} {kind}'])
+            lines.extend(f'{name}{_labels(["cache"], [cache])} {values[key]}' for cache, values in sorted(stats.items()))
+        for name, (description, get_value) in sorted(self.gauges.items()):
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} gauge', f'{name} {get_value()}'])
+        return '\n'.join(lines) + '\n'
+
+def timed(stage):
+    """Decorate a method of an object holding `metrics`, to record its latency as `stage`"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,64 @@
+"""
+Cache the serialized graph data sent in full, and splice it into the callback responses
+"""
+# import
+import json
+import uuid
+import flask
+from plotly.utils import PlotlyJSONEncoder
+from .cache import LRUCache
+
+# Constants
+#--------------
+# returned by the callbacks in place of the graph data, unique per process so no data can look like it
+PLACEHOLDER_PREFIX = f'jaal-payload-{uuid.uuid4().hex}-'
+
+# class
+class PayloadCache:
+    """The JSON of the full graph data of the views, cached per view key
+
+    Dash serializes whatever a callback returns, so the callbacks return a short
+    placeholder instead of the graph data and `splice` swaps it for the cached JSON
+    in the response. A view sent in full is then serialized once, not once per
+    request, and the views computed ahead (see `warmup`) cost a cache lookup.
+    """
+
+    def __init__(self, cache=None):
+        """
+        Parameters
+        -------------
+        cache: LRUCache (optional)
+            cache of the serialized views, shared by all the sessions
+        """
+        self.cache = LRUCache(max_items=256, max_bytes=256 * 2**20) if cache is None else cache
+
+    def get(self, key, view, store):
+        """JSON (bytes) of the full data of `view`, serialized on a miss"""
+        return self.cache.get_or_compute(key, lambda: json.dumps(
+            view.to_visdcc(store), cls=PlotlyJSONEncoder, separators=(',', ':')).encode())
+
+    def placeholder(self, payload):
+        """Value to return from the callback in place of the data serialized in `payload`
+
+        The payload is kept with the request until `splice`, outside of the cache
+        which may evict it meanwhile.
+        """
+        token = PLACEHOLDER_PREFIX + uuid.uuid4().hex
+        if 'jaal_payloads' not in flask.g:
+            flask.g.jaal_payloads = {}
+        flask.g.jaal_payloads[token] = payload
+        return token
+
+    @staticmethod
+    def splice(response):
+        """Swap the placeholders of the current request for their payload in the response"""
+        payloads = flask.g.pop('jaal_payloads', None)
+        if payloads:
+            data = response.get_data()
+            for token, payload in payloads.items():
+                data = data.replace(json.dumps(token).encode(), payload, 1)
+            response.set_data(data)
+        return response
+
+    def clear(self):
+        self.cache.clear()
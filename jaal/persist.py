@@ -0,0 +1,78 @@
+"""
+Save objects holding large numpy arrays to one file, and load them back memory-mapped
+"""
+# import
+import os
+import mmap
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Constants
+#--------------
+# first bytes of the files, bump the digit when the format changes
+MAGIC = b'JAALPKL1'
+# alignment of the array buffers in the file
+ALIGNMENT = 64
+
+# Code
+#---------
+def frames_hash(*dfs, salt=''):
+    """Content hash of dataframes (values, column names and dtypes), None frames included
+
+    Parameters
+    -----------
+    dfs: pandas dataframes or None
+        the frames to hash
+    salt: str
+        mixed in the hash, like the version of the code consuming the frames
+    """
+    digest = hashlib.sha1(str(salt).encode())
+    for df in dfs:
+        if df is None:
+            digest.update(b'\0None')
+            continue
+        digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def save_mmap_pickle(obj, path):
+    """Pickle `obj` to `path`, with the numpy array buffers stored raw and aligned
+
+    The file is written next to `path` and renamed, so readers never see a partial file.
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    # offset and length of every buffer, from the start of the buffer section
+    table, end = [], 0
+    for buffer in buffers:
+        length = buffer.raw().nbytes
+        table.append((end, length))
+        end += -(-length // ALIGNMENT) * ALIGNMENT
+    meta = pickle.dumps((table, data), protocol=5)
+    start = -(-(len(MAGIC) + 8 + len(meta)) // ALIGNMENT) * ALIGNMENT
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + np.uint64(len(meta)).tobytes() + meta)
+        for buffer, (offset, _) in zip(buffers, table):
+            f.seek(start + offset)
+            f.write(buffer.raw())
+        f.truncate(start + end)
+    os.replace(tmp_path, path)
+
+def load_mmap_pickle(path):
+    """Load an object saved with `save_mmap_pickle`
+
+    The numpy arrays are read-only views of the memory-mapped file, so they are only
+    read from disk when used, and processes loading the same file share the memory.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a jaal cache file.")
+        size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        table, data = pickle.loads(f.read(size))
+        start = -(-(len(MAGIC) + 8 + size) // ALIGNMENT) * ALIGNMENT
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if table else b''
+    view = memoryview(mapped)
+    return pickle.loads(data, buffers=[view[start + offset:start + offset + length] for offset, length in table])
@@ -0,0 +1,136 @@
+"""
+Server side force-directed layout of the graph, cached on disk
+"""
+# import
+import os
+import hashlib
+import numpy as np
+from .cache import get_cache_dir
+
+# Constants
+#--------------
+# bump when the layout algorithm changes, to invalidate the cached positions
+LAYOUT_VERSION = 1
+# cells processed at once against all the other cells, bounds the memory of the repulsion
+CHUNK_SIZE = 512
+
+# Code
+#---------
+def spring_layout(edge_src, edge_dst, n_nodes, iterations=50, grid=None, gravity=0.1, seed=0):
+    """Fruchterman-Reingold positions of the nodes, in the unit square around 0
+
+    The repulsion between all the nodes is approximated Barnes-Hut style: the nodes
+    are binned in a `grid` x `grid` grid, every cell is repelled by the center of
+    mass of the other cells and every node by the center of its own cell, so an
+    iteration costs O(n_nodes + n_edges + grid^4).
+
+    Parameters
+    -----------
+    edge_src, edge_dst: array of int
+        node row of the start and end of every edge
+    n_nodes: int
+        the number of nodes
+    iterations: int
+        number of layout steps
+    grid: int (optional)
+        cells per side of the repulsion grid, grows with the number of nodes by default
+    gravity: float
+        pull towards the center, keeps the disconnected components together
+    seed: int
+        seed of the initial positions
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n_nodes, 2)) - 0.5
+    if n_nodes < 2:
+        return pos
+    if grid is None:
+        grid = int(np.clip(np.sqrt(n_nodes) / 2, 8, 64))
+    # the edges without self-loops, duplicates only count once
+    keep = edge_src != edge_dst
+    pairs = np.unique(np.stack([np.minimum(edge_src, edge_dst), np.maximum(edge_src, edge_dst)])[:, keep], axis=1)
+    src, dst = pairs
+    # optimal distance between nodes, and the maximum move per step which cools down
+    k2 = 1.0 / n_nodes
+    k = np.sqrt(k2)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # bin the nodes, and get the mass and center of every occupied cell
+        low, span = pos.min(axis=0), np.ptp(pos, axis=0) + 1e-9
+        cells = np.clip(((pos - low) / span * grid).astype(np.int64), 0, grid - 1)
+        occupied, cell = np.unique(cells[:, 0] * grid + cells[:, 1], return_inverse=True)
+        cell = cell.ravel()
+        mass = np.bincount(cell).astype(float)
+        center = np.stack([np.bincount(cell, pos[:, 0]), np.bincount(cell, pos[:, 1])], axis=1) / mass[:, None]
+        # repulsion k^2 / d between the cells
+        field = np.zeros_like(center)
+        for start in range(0, len(center), CHUNK_SIZE):
+            dx = center[start:start + CHUNK_SIZE, None, 0] - center[None, :, 0]
+            dy = center[start:start + CHUNK_SIZE, None, 1] - center[None, :, 1]
+            weight = k2 * mass / np.maximum(dx * dx + dy * dy, 0.01 * k2)
+            # a cell does not repel itself
+            weight[np.arange(len(dx)), np.arange(start, start + len(dx))] = 0
+            field[start:start + CHUNK_SIZE, 0] = (dx * weight).sum(axis=1)
+            field[start:start + CHUNK_SIZE, 1] = (dy * weight).sum(axis=1)
+        # ... and from the other nodes of the same cell, seen from their center
+        delta = pos - center[cell]
+        disp = field[cell] + delta * (k2 * (mass[cell] - 1) / np.maximum((delta ** 2).sum(axis=1), 0.01 * k2))[:, None]
+        # attraction along the edges, d^2 / k
+        delta = pos[src] - pos[dst]
+        force = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        for axis in range(2):
+            disp[:, axis] += np.bincount(dst, force[:, axis], n_nodes) - np.bincount(src, force[:, axis], n_nodes)
+        disp -= gravity * pos * n_nodes * k
+        # move by at most the temperature
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    pos -= pos.mean(axis=0)
+    return pos / max(np.abs(pos).max(), 1e-9) / 2
+
+def graph_hash(node_ids, edge_src, edge_dst):
+    """Hash of the graph structure (node ids and edge ends), to key the cached positions
+    """
+    digest = hashlib.sha1()
+    digest.update(str(LAYOUT_VERSION).encode())
+    digest.update('\0'.join(map(str, node_ids)).encode())
+    digest.update(np.ascontiguousarray(edge_src, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(edge_dst, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+def get_positions(store, scale=None, cache_dir=None, **layout_args):
+    """x and y (in pixels) of every node of the store, read from the disk cache or computed
+
+    Parameters
+    -----------
+    store: GraphStore
+        the graph to lay out
+    scale: float (optional)
+        width of the layout in pixels, grows with the square root of the number of nodes by default
+    cache_dir: str (optional)
+        directory of the position cache, see `cache.get_cache_dir`
+    layout_args:
+        passed to `spring_layout`
+    """
+    key = graph_hash(store.nodes['id'].values, store.edge_src, store.edge_dst)
+    if layout_args:
+        key = hashlib.sha1((key + repr(sorted(layout_args.items()))).encode()).hexdigest()
+    path = os.path.join(get_cache_dir(cache_dir), f'positions-{key}.npy')
+    try:
+        pos = np.load(path)
+    except (OSError, ValueError):
+        pos = None
+    if pos is None or pos.shape != (store.n_nodes, 2):
+        print("Computing the layout...", end="")
+        pos = spring_layout(store.edge_src, store.edge_dst, store.n_nodes, **layout_args)
+        # write then rename, so that concurrent processes never read a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, pos)
+        os.replace(tmp_path, path)
+        print("Done")
+    scale = 40 * np.sqrt(store.n_nodes) + 200 if scale is None else scale
+    x, y = pos[:, 0] * scale, pos[:, 1] * scale
+    for values in (x, y):
+        values.flags.writeable = False
+    return x, y
@@ -0,0 +1,236 @@
+"""
+Compile the node/edge filter queries into vectorized evaluators over the store columns
+"""
+# import
+import io
+import re
+import ast
+import tokenize
+import operator
+import numpy as np
+import pandas as pd
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# Constants
+#--------------
+# supported operators, as numpy functions and numexpr syntax
+BIN_OPS = {ast.Add: (operator.add, '+'), ast.Sub: (operator.sub, '-'), ast.Mult: (operator.mul, '*'),
+           ast.Div: (operator.truediv, '/'), ast.Mod: (operator.mod, '%'), ast.Pow: (operator.pow, '**')}
+CMP_OPS = {ast.Eq: (operator.eq, '=='), ast.NotEq: (operator.ne, '!='), ast.Lt: (operator.lt, '<'),
+           ast.LtE: (operator.le, '<='), ast.Gt: (operator.gt, '>'), ast.GtE: (operator.ge, '>=')}
+UNARY_OPS = {ast.Not: (np.logical_not, '~'), ast.Invert: (np.invert, '~'), ast.USub: (operator.neg, '-'),
+             ast.UAdd: (operator.pos, '+')}
+# pandas query quotes column names with spaces or dashes in backticks
+BACKTICK = re.compile(r'`([^`]*)`')
+# like pandas query, `&` and `|` have the precedence of `and` and `or`
+BOOLEAN_TOKENS = {'&': ' and ', '|': ' or '}
+# numexpr only pays off on long columns, shorter ones are evaluated with numpy
+NUMEXPR_MIN_ROWS = 100000
+
+# Code
+#---------
+class CompiledQuery:
+    """A query checked against the columns of a dataframe, ready to be evaluated on it
+
+    Comparisons, `in`/`not in` (or `==`/`!=`) with a list, arithmetic, `and`/`or`/`not`
+    (and `&`, `|`, `~`) on columns and constants are compiled. Anything else pandas
+    accepts, like `au_list.str.contains('Smith')` or `index > 5`, is run by
+    `DataFrame.eval` as before.
+
+    Parameters
+    -----------
+    text: str
+        the query, in pandas query syntax
+    df: pandas dataframe
+        the frame the query runs on, only its columns and dtypes are used here
+    """
+
+    def __init__(self, text, df):
+        self.text = text
+        # replace the backtick quoted names by identifiers
+        self.names = {}
+        def quote(match):
+            name = '_col_%d' % len(self.names)
+            self.names[name] = match.group(1)
+            return name
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(BACKTICK.sub(quote, text).strip().replace('\n', ' ')).readline)
+            source = tokenize.untokenize((tok.type, BOOLEAN_TOKENS.get(tok.string, tok.string)) if tok.type == tokenize.OP
+                                         else (tok.type, tok.string) for tok in tokens)
+            tree = ast.parse(source.strip(), mode='eval')
+        except (SyntaxError, tokenize.TokenError) as e:
+            raise Exception(f"Invalid query syntax: {e.args[0]}")
+        self.dtypes = df.dtypes
+        self.columns = []
+        self.evaluate = None
+        self.numexpr_text = None
+        try:
+            self._kind(tree.body)
+        except _Unsupported as unsupported:
+            # beyond the compiled grammar, check it with pandas on the empty frame
+            try:
+                result = df.iloc[:0].eval(text)
+            except Exception as e:
+                if isinstance(unsupported, _UnknownColumn):
+                    raise Exception(str(unsupported))
+                raise Exception(f"Invalid query: {e}")
+            if not isinstance(result, pd.Series):
+                raise Exception("Query does not evaluate to one boolean per row.")
+            return
+        self.evaluate = self._compile(tree.body)
+        # the whole query can run in numexpr if it only touches numerical columns
+        if numexpr is not None:
+            try:
+                self.numexpr_text = self._numexpr(tree.body)
+            except _NotNumexpr:
+                pass
+
+    def _column(self, node):
+        """Name of the column an ast.Name refers to, checking that it exists"""
+        name = self.names.get(node.id, node.id)
+        if name not in self.dtypes.index:
+            # maybe a name pandas resolves, like `index`
+            raise _UnknownColumn(f"Unknown column '{name}' in query.")
+        return name
+
+    def _kind(self, node):
+        """Check the expression and return its kind: 'num', 'str', 'bool' or 'list'"""
+        if isinstance(node, ast.Name):
+            name = self._column(node)
+            self.columns.append(name)
+            dtype = self.dtypes[name]
+            if pd.api.types.is_bool_dtype(dtype):
+                return 'bool'
+            return 'num' if pd.api.types.is_numeric_dtype(dtype) else 'str'
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool):
+                return 'bool'
+            if isinstance(node.value, (int, float)):
+                return 'num'
+            if isinstance(node.value, str):
+                return 'str'
+        if isinstance(node, (ast.List, ast.Tuple)):
+            for elt in node.elts:
+                if not isinstance(elt, ast.Constant):
+                    raise _Unsupported("Only constants are supported in query lists.")
+            return 'list'
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._kind(value)
+            return 'bool'
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+            kind = self._kind(node.operand)
+            return 'bool' if isinstance(node.op, (ast.Not, ast.Invert)) else kind
+        if isinstance(node, ast.BinOp) and type(node.op) in BIN_OPS:
+            left, right = self._kind(node.left), self._kind(node.right)
+            if 'str' in (left, right) and not (isinstance(node.op, ast.Add) and left == right):
+                raise Exception("Arithmetic on a text column in query.")
+            return 'num'
+        if isinstance(node, ast.Compare):
+            kinds = [self._kind(node.left)] + [self._kind(x) for x in node.comparators]
+            for left, op, right in zip(kinds, node.ops, kinds[1:]):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    if right != 'list':
+                        raise Exception("'in' needs a list of values in query.")
+                elif isinstance(op, (ast.Eq, ast.NotEq)) and 'list' in (left, right):
+                    # like pandas query, the same as `in` and `not in`
+                    continue
+                elif 'list' in (left, right):
+                    raise Exception("Only ==, !=, in and not in take a list of values in query.")
+                elif type(op) not in CMP_OPS:
+                    raise _Unsupported("Unsupported comparison in query.")
+                elif {left, right} == {'str', 'num'}:
+                    raise Exception("Comparison of a text column with a number in query.")
+            return 'bool'
+        raise _Unsupported(f"Unsupported expression in query: {type(node).__name__}.")
+
+    def _compile(self, node):
+        """Turn the checked expression into a function of the column dict"""
+        if isinstance(node, ast.Name):
+            name = self._column(node)
+            return lambda cols: cols[name]
+        if isinstance(node, ast.Constant):
+            value = node.value
+            return lambda cols: value
+        if isinstance(node, (ast.List, ast.Tuple)):
+            values = [elt.value for elt in node.elts]
+            return lambda cols: values
+        if isinstance(node, ast.BoolOp):
+            funcs = [self._compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda cols: combine.reduce([np.asarray(f(cols), dtype=bool) for f in funcs])
+        if isinstance(node, ast.UnaryOp):
+            func, operand = UNARY_OPS[type(node.op)][0], self._compile(node.operand)
+            return lambda cols: func(operand(cols))
+        if isinstance(node, ast.BinOp):
+            func, left, right = BIN_OPS[type(node.op)][0], self._compile(node.left), self._compile(node.right)
+            return lambda cols: func(left(cols), right(cols))
+        # comparisons, possibly chained
+        operands = [self._compile(node.left)] + [self._compile(x) for x in node.comparators]
+        lists = [isinstance(x, (ast.List, ast.Tuple)) for x in [node.left] + node.comparators]
+        steps = list(zip(node.ops, operands, operands[1:], lists, lists[1:]))
+        def compare(cols):
+            result = True
+            for op, left, right, left_list, right_list in steps:
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    value = np.isin(left(cols), right(cols), invert=isinstance(op, ast.NotIn))
+                elif isinstance(op, (ast.Eq, ast.NotEq)) and (left_list or right_list):
+                    values, items = (right, left) if left_list else (left, right)
+                    value = np.isin(values(cols), items(cols), invert=isinstance(op, ast.NotEq))
+                else:
+                    value = CMP_OPS[type(op)][0](left(cols), right(cols))
+                result = np.logical_and(result, value)
+            return result
+        return compare
+
+    def _numexpr(self, node):
+        """numexpr text of the expression, raise _NotNumexpr if it can not run in numexpr"""
+        if isinstance(node, ast.Name):
+            name = self._column(node)
+            if self._kind(node) == 'str':
+                raise _NotNumexpr()
+            return self._var(name)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return repr(node.value)
+        if isinstance(node, ast.BoolOp):
+            sep = ' & ' if isinstance(node.op, ast.And) else ' | '
+            return '(' + sep.join(self._numexpr(value) for value in node.values) + ')'
+        if isinstance(node, ast.UnaryOp):
+            return '(' + UNARY_OPS[type(node.op)][1] + self._numexpr(node.operand) + ')'
+        if isinstance(node, ast.BinOp):
+            return '(' + self._numexpr(node.left) + BIN_OPS[type(node.op)][1] + self._numexpr(node.right) + ')'
+        if isinstance(node, ast.Compare) and all(type(op) in CMP_OPS for op in node.ops):
+            operands = [node.left] + node.comparators
+            return '(' + ' & '.join('(' + self._numexpr(left) + CMP_OPS[type(op)][1] + self._numexpr(right) + ')'
+                                    for op, left, right in zip(node.ops, operands, operands[1:])) + ')'
+        raise _NotNumexpr()
+
+    def _var(self, name):
+        """numexpr variable of a column"""
+        return '_v%d' % self.dtypes.index.get_loc(name)
+
+    def mask(self, df):
+        """Boolean mask of the rows of `df` matching the query"""
+        if self.evaluate is None:
+            result = df.eval(self.text)
+        elif self.numexpr_text is not None and len(df) >= NUMEXPR_MIN_ROWS:
+            local_dict = {self._var(name): df[name].values for name in set(self.columns)}
+            result = numexpr.evaluate(self.numexpr_text, local_dict=local_dict)
+        else:
+            result = self.evaluate({name: df[name].values for name in set(self.columns)})
+        result = np.asarray(result)
+        if result.dtype != bool or result.shape != (len(df),):
+            raise Exception("Query does not evaluate to one boolean per row.")
+        return result
+
+class _Unsupported(Exception):
+    """The expression uses something the compiler does not support"""
+
+class _UnknownColumn(_Unsupported):
+    """The expression uses a name which is not a column"""
+
+class _NotNumexpr(Exception):
+    """The expression uses something numexpr does not support"""
@@ -0,0 +1,164 @@
+"""
+Inverted n-gram index answering substring searches over a column of strings
+"""
+# import
+import numpy as np
+
+# Constants
+#--------------
+# bits per code point, enough for the whole unicode range
+CODE_BITS = 21
+# strings split in n-grams at once, to bound the temporary arrays
+BLOCK_SIZE = 8192
+
+# Code
+#---------
+def _gram_codes(strings, n):
+    """Return every n-gram of the strings as one integer, with the position of the string it came from
+
+    Parameters
+    -----------
+    strings: list of str
+        the strings to split in n-grams
+    n: int
+        the gram length, at most 3 so that a gram fits in an int64
+    """
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    codes = np.frombuffer(''.join(strings).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    owner = np.repeat(np.arange(len(strings)), lengths)
+    if len(codes) < n:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    grams = np.zeros(len(codes) - n + 1, dtype=np.int64)
+    for k in range(n):
+        grams = (grams << CODE_BITS) | codes[k:len(codes) - n + 1 + k]
+    # drop the grams spanning two strings
+    ends = np.cumsum(lengths)[owner[:len(grams)]]
+    keep = np.arange(len(grams)) + n <= ends
+    return grams[keep], owner[:len(grams)][keep]
+
+class _Postings:
+    """Sorted, de-duplicated (gram, row) pairs stored as one array of rows per gram
+
+    The grams are split `BLOCK_SIZE` strings at a time into preallocated arrays,
+    and the `rows` (increasing) are stored as int32 when they fit.
+    """
+
+    def __init__(self, strings, rows, n):
+        rows = np.asarray(rows, dtype=np.int64)
+        row_dtype = np.int32 if len(rows) == 0 or rows.max() <= np.iinfo(np.int32).max else np.int64
+        total = sum(max(len(s) - n + 1, 0) for s in strings)
+        grams, owner = np.empty(total, dtype=np.int64), np.empty(total, dtype=row_dtype)
+        done = 0
+        for start in range(0, len(strings), BLOCK_SIZE):
+            block_grams, block_owner = _gram_codes(strings[start:start + BLOCK_SIZE], n)
+            grams[done:done + len(block_grams)] = block_grams
+            owner[done:done + len(block_grams)] = rows[start + block_owner]
+            done += len(block_grams)
+        # the rows are increasing, so a stable sort keeps them sorted within every gram
+        order = np.argsort(grams, kind='stable')
+        grams = grams[order]
+        owner = owner[order]
+        del order
+        first = np.ones(len(grams), dtype=bool)
+        first[1:] = (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])
+        grams, self.rows = grams[first], owner[first]
+        starts = np.flatnonzero(np.concatenate([[True], grams[1:] != grams[:-1]])) if len(grams) else np.empty(0, dtype=np.int64)
+        self.keys, self.offsets = grams[starts], np.append(starts, len(grams))
+
+    def get(self, gram):
+        """Rows containing the gram, sorted"""
+        pos = np.searchsorted(self.keys, gram)
+        if pos == len(self.keys) or self.keys[pos] != gram:
+            return self.rows[:0]
+        return self.rows[self.offsets[pos]:self.offsets[pos + 1]]
+
+class NGramIndex:
+    """Substring search over a column of strings using an inverted n-gram index
+
+    A query is answered by intersecting the posting lists of its n-grams, and only
+    the remaining candidates are checked with a substring test. Queries shorter than
+    `n` fall back to scanning the whole column.
+
+    Updated strings go to a small delta index that is merged back once it grows
+    beyond `compact_ratio` of the column, so that updates do not rebuild everything.
+    """
+
+    def __init__(self, strings, n=3, compact_ratio=0.1):
+        """
+        Parameters
+        -----------
+        strings: iterable of str
+            the column to index, row `i` is the `i`-th string
+        n: int
+            the gram length (1 to 3)
+        compact_ratio: float
+            fraction of updated rows triggering a full rebuild
+        """
+        if not 1 <= n <= 3:
+            raise Exception("NGramIndex supports gram length between 1 and 3.")
+        self.n = n
+        self.compact_ratio = compact_ratio
+        self.strings = np.array([str(x) for x in strings], dtype=object)
+        self.compact()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def compact(self):
+        """Rebuild the main index over all the rows and drop the delta index
+        """
+        self._main = _Postings(self.strings.tolist(), np.arange(len(self.strings)), self.n)
+        self._stale = np.zeros(len(self.strings), dtype=bool)
+        self._delta = None
+
+    def update(self, rows, strings):
+        """Set the string of the given rows, rows past the end are appended
+
+        Parameters
+        -----------
+        rows: array of int
+            rows to update
+        strings: iterable of str
+            new value of each row
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) and rows.max() >= len(self.strings):
+            grow = rows.max() + 1 - len(self.strings)
+            self.strings = np.append(self.strings, np.full(grow, '', dtype=object))
+            self._stale = np.append(self._stale, np.zeros(grow, dtype=bool))
+        self.strings[rows] = [str(x) for x in strings]
+        self._stale[rows] = True
+        if self._stale.sum() > self.compact_ratio * len(self.strings):
+            self.compact()
+        else:
+            stale = np.flatnonzero(self._stale)
+            self._delta = _Postings(self.strings[stale].tolist(), stale, self.n)
+
+    def _candidates(self, postings, grams):
+        """Intersect the posting lists of the grams, shortest first
+
+        Stops early once the candidates are much fewer than the next list, as
+        checking them is then cheaper than the intersection
+        """
+        lists = sorted((postings.get(gram) for gram in grams), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if 4 * len(rows) < len(other):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def search(self, text):
+        """Sorted rows whose string contains `text`
+        """
+        text = str(text)
+        if len(text) < self.n:
+            rows = np.arange(len(self.strings))
+        else:
+            grams = np.unique(_gram_codes([text], self.n)[0])
+            rows = self._candidates(self._main, grams)
+            rows = rows[~self._stale[rows]]
+            if self._delta is not None:
+                rows = np.union1d(rows, self._candidates(self._delta, grams))
+        # remove the false positives (grams present but not contiguous)
+        return rows[np.fromiter((text in s for s in self.strings[rows]), dtype=bool, count=len(rows))]
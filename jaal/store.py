@@ -0,0 +1,306 @@
+"""
+Columnar in-memory store of the parsed network data
+"""
+# import
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from .cache import get_cache_dir
+from .search import NGramIndex
+from .persist import frames_hash, save_mmap_pickle, load_mmap_pickle
+from .datasets.parse_dataframe import parse_frames, parse_chunks, PARSER_VERSION
+from .datasets.schema import describe_frames
+from .datasets.ingest import read_frame, read_chunks, EDGE_DTYPES, NODE_DTYPES
+
+# Constants
+#--------------
+# bump when the attributes of the store change, to invalidate the cached stores
+STORE_VERSION = 1
+
+# class
+class GraphStore:
+    """Keep the nodes and edges as columns and hand out visdcc dicts only on demand
+
+    Rows are addressed by their integer position, and the node/edge `id` columns
+    are hash indexed so that ids coming back from the browser resolve to rows
+    without scanning. Edges are kept sorted by year, so that a year range is a
+    contiguous slice of rows.
+    """
+
+    def __init__(self, nodes_df, edges_df, scaling_vars, schema=None):
+        """
+        Parameters
+        -------------
+        nodes_df: pandas dataframe
+            The parsed node data, one row per node
+
+        edges_df: pandas dataframe
+            The parsed edge data, one row per edge
+
+        scaling_vars: dict
+            min/max of the numerical node and edge columns
+
+        schema: dict (optional)
+            `FrameSchema` of the node and edge frames, described from the frames if None
+        """
+        self.nodes = nodes_df.reset_index(drop=True)
+        # integer year of every edge, with the edges sorted by it
+        year = edges_df['year-factor'].astype(int).values
+        if np.all(year[:-1] <= year[1:]):
+            # already sorted, like the edges of `parse_chunks`: no copy
+            self.edges = edges_df if isinstance(edges_df.index, pd.RangeIndex) else edges_df.reset_index(drop=True)
+            self.edge_year = year
+        else:
+            order = np.argsort(year, kind='stable')
+            self.edges = edges_df.iloc[order].reset_index(drop=True)
+            self.edge_year = year[order]
+        self.scaling_vars = scaling_vars
+        # the order of the rows does not matter to the schema
+        self.schema = describe_frames(self.nodes, self.edges) if schema is None else schema
+        # identifies this data in the caches shared between sessions
+        self.version = uuid.uuid4().hex
+        # id -> row hash index
+        self.node_index = pd.Index(self.nodes['id'])
+        # node row of both ends of every edge, the first node wins in case of duplicated ids
+        first = ~self.node_index.duplicated()
+        first_rows, unique_ids = np.flatnonzero(first), self.node_index[first]
+        self.edge_src = first_rows[unique_ids.get_indexer(self.edges['from'])]
+        self.edge_dst = first_rows[unique_ids.get_indexer(self.edges['to'])]
+        self.adjacency = Adjacency(self.edge_src, self.edge_dst, len(self.nodes))
+        # substring search indexes over node labels and edge idd
+        self.label_index = NGramIndex(self.nodes['label'] if 'label' in self.nodes else self.nodes['id'])
+        self.idd_index = NGramIndex(self.edges['idd'])
+        # the store is shared by all the sessions and threads, guard the arrays against writes
+        for values in [self.edge_year, self.edge_src, self.edge_dst, self.adjacency.out_offsets,
+                       self.adjacency.out_edges, self.adjacency.in_offsets, self.adjacency.in_edges]:
+            values.flags.writeable = False
+
+    @classmethod
+    def from_dataframe(cls, edge_df, node_df=None, cache=False, cache_dir=None, workers=1):
+        """Parse the network dataframes and load them in the store
+
+        Parameters
+        -------------
+        edge_df, node_df: pandas dataframe
+            the network data, see `parse_frames`
+
+        cache: boolean
+            reuse the store saved on disk for the same data and parser version, and
+            save it there otherwise (default: False)
+
+        cache_dir: str (optional)
+            directory of the cached stores, see `cache.get_cache_dir`
+
+        workers: int (optional)
+            processes parsing the data, None for one per CPU, see `parse_frames`
+        """
+        if not cache:
+            return cls(*parse_frames(edge_df, node_df, workers))
+        # hash before parsing, as the parser converts some columns in place
+        key = frames_hash(edge_df, node_df, salt=f'{PARSER_VERSION}.{STORE_VERSION}')
+        path = os.path.join(get_cache_dir(cache_dir), f'graph-{key}.jaal')
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                print(f"Ignoring the unreadable cached graph {path}: {e}")
+        store = cls(*parse_frames(edge_df, node_df, workers))
+        store.save(path)
+        return store
+
+    @classmethod
+    def from_files(cls, edges_path, nodes_path=None, edge_dtypes=None, node_dtypes=None, chunksize=None,
+                   progress=True, cache=False, cache_dir=None, workers=1):
+        """Read the network data from CSV (or parquet) files in chunks, and load it in the store
+
+        The edges are parsed chunk by chunk (see `parse_chunks`), so the raw edge
+        file is never held at once, and the columns keep the dtypes they are read
+        with: the `*_dtypes` categorical columns stay categorical and `year-factor`
+        stays an integer.
+
+        Parameters
+        -------------
+        edges_path, nodes_path: str
+            the edge and (optional) node files
+
+        edge_dtypes, node_dtypes: dict (optional)
+            dtype of the columns, on top of `ingest.EDGE_DTYPES` and `ingest.NODE_DTYPES`
+
+        chunksize: int (optional)
+            rows read at once
+
+        progress: boolean
+            print the progress while reading
+
+        cache: boolean
+            reuse the store saved on disk for the same files (path, size and modification
+            time) and parser version, without reading the files (default: False)
+
+        cache_dir: str (optional)
+            directory of the cached stores, see `cache.get_cache_dir`
+
+        workers: int (optional)
+            processes parsing the data, None for one per CPU, see `parse_frames`
+        """
+        edge_dtypes = {**EDGE_DTYPES, **(edge_dtypes or {})}
+        node_dtypes = {**NODE_DTYPES, **(node_dtypes or {})}
+        if cache:
+            stats = [(os.path.abspath(p), os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in [edges_path, nodes_path] if p]
+            key = frames_hash(salt=repr((stats, sorted(edge_dtypes.items()), sorted(node_dtypes.items()),
+                                         PARSER_VERSION, STORE_VERSION)))
+            path = os.path.join(get_cache_dir(cache_dir), f'graph-{key}.jaal')
+            if os.path.exists(path):
+                try:
+                    return cls.load(path)
+                except Exception as e:
+                    print(f"Ignoring the unreadable cached graph {path}: {e}")
+        read_args = {'progress': progress}
+        if chunksize:
+            read_args['chunksize'] = chunksize
+        node_df = read_frame(nodes_path, node_dtypes, label='nodes', **read_args) if nodes_path else None
+        edge_chunks = read_chunks(edges_path, edge_dtypes, label='edges', **read_args)
+        store = cls(*parse_chunks(edge_chunks, node_df, workers))
+        if cache:
+            store.save(path)
+        return store
+
+    def save(self, path):
+        """Save the store and its indexes to one file, see `load`
+        """
+        save_mmap_pickle(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a store saved with `save`
+
+        The arrays are memory-mapped read-only, so loading does not parse nor copy
+        the data, and processes loading the same file share its memory. The file is
+        unpickled, so it can run code: only load files from a trusted directory.
+        """
+        store = load_mmap_pickle(path)
+        if not isinstance(store, cls):
+            raise Exception(f"{path} does not hold a {cls.__name__}.")
+        return store
+
+    def share(self):
+        """Get the store ready to be shared by the processes forked afterwards, like the
+        workers of `gunicorn --preload`
+
+        The lazily built id hash table is built once now, instead of in every worker.
+        The numerical arrays stay shared, but the text (object) columns are only shared
+        until a worker reads them: reading a string updates its reference count, which
+        copies its memory page into the worker.
+        """
+        self.node_index.get_indexer_for(self.node_index[:1])
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.edges)
+
+    @property
+    def year_bounds(self):
+        """First and last year of the edges"""
+        if self.n_edges == 0:
+            return None
+        return int(self.edge_year[0]), int(self.edge_year[-1])
+
+    def year_slice(self, min_year, max_year):
+        """Rows of the edges from `min_year` to `max_year` (both included), as a slice
+        """
+        return slice(np.searchsorted(self.edge_year, min_year, side='left'),
+                     np.searchsorted(self.edge_year, max_year, side='right'))
+
+    def node_rows(self, ids):
+        """Sorted rows of the nodes with the given ids, unknown ids are skipped
+        """
+        rows = self.node_index.get_indexer_for(ids)
+        return np.unique(rows[rows >= 0])
+
+    def to_visdcc(self, node_rows=None, edge_rows=None, node_attrs=None, edge_attrs=None):
+        """Materialize the selected rows into the visdcc format
+
+        Parameters
+        -------------
+        node_rows, edge_rows: array of int (optional)
+            rows to materialize, all rows if None
+
+        node_attrs, edge_attrs: dict (optional)
+            column name to full length array, overriding the stored column, or
+            to None to leave the column out
+        """
+        nodes = _records(self.nodes, node_rows, node_attrs)
+        edges = _records(self.edges, edge_rows, edge_attrs)
+        for edge in edges:
+            edge['color'] = {'color': edge['color']}
+        return {'nodes': nodes, 'edges': edges}
+
+class Adjacency:
+    """Compressed sparse row (CSR) adjacency of the graph, in both directions
+
+    The edges leaving node `i` are the edge rows `out_edges[out_offsets[i]:out_offsets[i+1]]`,
+    and likewise `in_edges`/`in_offsets` for the edges reaching it. The edges touching
+    many nodes at once are queried as masked degrees (see `degree`): the search keeps
+    the nodes with a matching visible edge, and the isolated node pass the nodes with
+    any visible edge.
+    """
+
+    def __init__(self, edge_src, edge_dst, n_nodes):
+        """
+        Parameters
+        -------------
+        edge_src, edge_dst: array of int
+            node row of the start and end of every edge
+
+        n_nodes: int
+            the number of nodes
+        """
+        self.n_nodes = n_nodes
+        self.out_offsets, self.out_edges = _csr(edge_src, n_nodes)
+        self.in_offsets, self.in_edges = _csr(edge_dst, n_nodes)
+
+    def _slices(self, direction):
+        if direction == 'out':
+            return [(self.out_offsets, self.out_edges)]
+        if direction == 'in':
+            return [(self.in_offsets, self.in_edges)]
+        return [(self.out_offsets, self.out_edges), (self.in_offsets, self.in_edges)]
+
+    def degree(self, edge_mask=None, direction='both'):
+        """Degree of every node, counting only the edges in `edge_mask` if given
+
+        Self-loops count twice when `direction` is 'both'.
+        """
+        degree = np.zeros(self.n_nodes, dtype=np.int64)
+        for offsets, edges in self._slices(direction):
+            if edge_mask is None:
+                degree += np.diff(offsets)
+            else:
+                counts = np.concatenate([[0], np.cumsum(edge_mask[edges])])
+                degree += counts[offsets[1:]] - counts[offsets[:-1]]
+        return degree
+
+def _csr(keys, n):
+    """Offsets and the positions of `keys` grouped by key value, for keys in [0, n)"""
+    order = np.argsort(keys, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=n))])
+    return offsets, order
+
+def _records(df, rows, attrs):
+    """Convert the selected rows of `df` to a list of dicts, with `attrs` overriding columns
+
+    A column set to None in `attrs` is left out.
+    """
+    if rows is not None:
+        df = df.iloc[rows]
+    if attrs:
+        omitted = [col for col, values in attrs.items() if values is None and col in df.columns]
+        if omitted:
+            df = df.drop(columns=omitted)
+        df = df.assign(**{col: (values if rows is None else np.asarray(values)[rows])
+                          for col, values in attrs.items() if values is not None})
+    return df.to_dict(orient='records')
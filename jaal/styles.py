@@ -0,0 +1,94 @@
+"""
+Per column colors and sizes of the nodes and edges, computed once and shared by all the sessions
+"""
+# import
+import numpy as np
+import pandas as pd
+from .cache import LRUCache
+from .layout import get_distinct_colors, DEFAULT_COLOR, DEFAULT_NODE_SIZE, DEFAULT_EDGE_SIZE
+
+# class
+class StyleCache:
+    """Color and size arrays of the store rows for every "Color by" / "Size by" column
+
+    Colors are a gather of the column palette by the factorized codes of the column,
+    sizes are scaled with the min/max of the store schema. The arrays are cached and
+    read-only, so a view keeps the very same array as long as the setting does not change.
+    """
+
+    def __init__(self, store, cache=None):
+        """
+        Parameters
+        -------------
+        store: GraphStore
+            the graph data to style
+
+        cache: LRUCache (optional)
+            where to keep the computed arrays
+        """
+        self.store = store
+        self.cache = LRUCache(max_items=64) if cache is None else cache
+
+    def _frame(self, kind):
+        return self.store.nodes if kind == 'nodes' else self.store.edges
+
+    def _cached(self, key, compute):
+        def compute_readonly():
+            value = compute()
+            for array in value if isinstance(value, tuple) else (value,):
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+            return value
+        return self.cache.get_or_compute(key + (self.store.version,), compute_readonly)
+
+    def palette(self, kind, column):
+        """Factorized codes of the categorical column and the color of every code
+
+        Returns
+        -------
+            codes: array of int
+                the code of every row, -1 for missing values
+
+            palette: array of str
+                the color of every code, in order of first appearance of the values
+
+            uniques: array
+                the value of every code
+        """
+        def compute():
+            codes, uniques = pd.factorize(self._frame(kind)[column])
+            palette = np.array(get_distinct_colors(len(uniques)), dtype=object)[:len(uniques)]
+            return codes, palette, uniques
+        return self._cached((kind, 'palette', column), compute)
+
+    def colors(self, kind, column):
+        """Color of every row for the categorical column ('None' for the default color), with the value -> color mapping
+        """
+        if column == 'None':
+            return self._cached((kind, 'colors', column),
+                                lambda: (np.full(len(self._frame(kind)), DEFAULT_COLOR, dtype=object), {}))
+        def compute():
+            codes, palette, uniques = self.palette(kind, column)
+            # missing values (code -1) get the default color
+            colors = np.append(palette, DEFAULT_COLOR)[codes]
+            return colors, dict(zip(uniques, palette))
+        return self._cached((kind, 'colors', column), compute)
+
+    def sizes(self, kind, column):
+        """Node size or edge width of every row for the numerical column ('None' for the default size)
+        """
+        if column == 'None':
+            default = DEFAULT_NODE_SIZE if kind == 'nodes' else DEFAULT_EDGE_SIZE
+            return self._cached((kind, 'sizes', column),
+                                lambda: np.full(len(self._frame(kind)), default))
+        def compute():
+            df = self._frame(kind)
+            minn, maxx = self.store.schema['node' if kind == 'nodes' else 'edge'].scaling(column)
+            # set size after scaling, a constant column gets the smallest size
+            scaled = 20 * (df[column].values - minn) / (maxx - minn) if maxx != minn \
+                else np.zeros(len(df))
+            # node sizes grow from the base size of the node
+            if kind == 'nodes':
+                scaled = df['size'].values + scaled
+            return scaled
+        return self._cached((kind, 'sizes', column), compute)
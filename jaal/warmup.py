@@ -0,0 +1,136 @@
+"""
+Compute the views of the checklist filter combinations ahead, in the background
+"""
+# import
+import sys
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import resource
+except ImportError:
+    # not on Windows, the peak memory is not reported
+    resource = None
+
+# Constants
+#--------------
+# options of the checklists of the setting panel, every combination is computed
+CHECKLISTS = {'edgestype_value': ['LMLM', 'LMHC', 'HCHC'],
+              'edgessc_value': ['Cross country edge', 'Domestic edge'],
+              'selfloop_value': ['Omit self-loop']}
+
+# Code
+#---------
+def peak_rss_bytes():
+    """Peak resident memory of the process, None on Windows"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def checklist_settings(defaults, checklists=CHECKLISTS):
+    """Settings of every combination of the checklist options, the other settings at their `defaults`"""
+    keys = list(checklists)
+    subsets = [[list(subset) for size in range(len(checklists[key]) + 1)
+                for subset in itertools.combinations(checklists[key], size)] for key in keys]
+    return [{**defaults, **dict(zip(keys, combination))} for combination in itertools.product(*subsets)]
+
+def component_values(layout, properties):
+    """Initial value of the (component id, property) pairs in the layout, None if not set"""
+    values = dict.fromkeys(properties)
+    stack = [layout]
+    while stack:
+        component = stack.pop()
+        if isinstance(component, (list, tuple)):
+            stack.extend(component)
+            continue
+        # text and numbers among the children
+        if not hasattr(component, 'to_plotly_json'):
+            continue
+        component_id = getattr(component, 'id', None)
+        for key in properties:
+            if key[0] == component_id:
+                values[key] = getattr(component, key[1], None)
+        stack.append(getattr(component, 'children', None))
+    return values
+
+# class
+class WarmUp:
+    """Run `compute(settings)` on a list of settings with a thread pool, in a background thread
+
+    The progress, time and peak memory are reported by `status`, the failures are
+    printed and counted.
+    """
+
+    def __init__(self, compute, settings_list, workers=2, caches=()):
+        """
+        Parameters
+        -------------
+        compute: function
+            called with each settings, caches its results
+
+        settings_list: list of dict
+            the settings to compute
+
+        workers: int
+            threads computing at once
+
+        caches: list of LRUCache
+            the caches filled, for the memory report
+        """
+        self.compute = compute
+        self.settings_list = settings_list
+        self.workers = workers
+        self.caches = caches
+        self.done = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, background=True):
+        """Start computing, and return at once if `background`"""
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name='jaal-warmup', daemon=True)
+        self.thread.start()
+        if not background:
+            self.wait()
+        return self
+
+    def wait(self, timeout=None):
+        """Wait for the end of the warm-up"""
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self):
+        with ThreadPoolExecutor(self.workers) as pool:
+            list(pool.map(self._compute_one, self.settings_list))
+        self.finished = time.perf_counter()
+        status = self.status()
+        print(f"Warm-up done: {status['done']} views in {status['seconds']:.1f}s, "
+              f"{status['cache_bytes'] / 2**20:.1f} MB cached")
+
+    def _compute_one(self, settings):
+        try:
+            self.compute(settings)
+        except Exception as e:
+            print(f"Warm-up failed for {settings}: {e}")
+            with self.lock:
+                self.failed += 1
+        with self.lock:
+            self.done += 1
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def status(self):
+        """Progress, time spent and memory used"""
+        end = self.finished or time.perf_counter()
+        return {'done': self.done, 'total': len(self.settings_list), 'failed': self.failed,
+                'running': self.running, 'seconds': end - self.started if self.started else 0.0,
+                'cache_bytes': sum(cache.nbytes for cache in self.caches),
+                'peak_rss_bytes': peak_rss_bytes()}
@@ -1,4 +1,5 @@
 # import
+import gc
 from jaal import Jaal
 from jaal.datasets import load_got
 
@@ -14,5 +15,10 @@ vis_opts = {'height': '600px', # change height
 # Jaal(edge_df, node_df).plot(vis_opts=vis_opts)
 
 # init Jaal and run server (with gunicorn)
-app = Jaal(edge_df, node_df).create()
-server = app.server
\ No newline at end of file
+jaal = Jaal(edge_df, node_df, cache=True)
+app = jaal.create()
+server = app.server
+# the workers forked by `gunicorn --preload` share the graph loaded here
+jaal.store.share()
+# keep the garbage collector off the objects loaded so far
+gc.freeze()
@@ -0,0 +1,69 @@
+"""
+Tests of the graph updates sent to the browser as patches
+"""
+# import
+import json
+from plotly.utils import PlotlyJSONEncoder
+from jaal import Jaal
+from jaal.datasets import make_coauthorship
+
+# Code
+#---------
+def _post(client, values, triggered, view_state):
+    """Send the main callback inputs like the browser does, and return its response"""
+    dependency = [x for x in client.get('/_dash-dependencies').get_json() if 'graph.data' in x['output']][0]
+    body = {'output': dependency['output'],
+            'outputs': [dict(zip(['id', 'property'], output.split('.')))
+                        for output in dependency['output'].strip('.').split('...')],
+            'inputs': [dict(x, value=values.get(f"{x['id']}.{x['property']}")) for x in dependency['inputs']],
+            'state': [dict(x, value=view_state) for x in dependency['state']],
+            'changedPropIds': [triggered] if triggered else []}
+    response = client.post('/_dash-update-component', json=body)
+    assert response.status_code == 200
+    return response.get_json()['response']
+
+def _apply(data, update):
+    """Update the browser data with a full graph or the operations of a Dash patch"""
+    if '__dash_patch_update' not in update:
+        return update
+    for operation in update['operations']:
+        *path, last = operation['location']
+        target = data
+        for key in path:
+            target = target[key]
+        if operation['operation'] == 'Delete':
+            del target[last]
+        elif operation['operation'] == 'Insert':
+            target[last].insert(operation['params']['index'], operation['params']['value'])
+        elif operation['operation'] == 'Assign':
+            target[last] = operation['params']['value']
+        else:
+            raise Exception(f"Unexpected patch operation {operation['operation']}.")
+    return data
+
+def _expected(jaal, settings):
+    view = jaal.get_view(settings)[0]
+    return json.loads(json.dumps(view.to_visdcc(jaal.store), cls=PlotlyJSONEncoder))
+
+def test_patches_of_a_session_served_by_two_processes():
+    edge_df, node_df = make_coauthorship(3000)
+    apps = [Jaal(edge_df.copy(), node_df.copy()) for _ in range(2)]
+    clients = [jaal.create().server.test_client() for jaal in apps]
+    values = {'edgestype_input.value': ['LMLM', 'LMHC', 'HCHC'],
+              'edges_sc_input.value': ['Cross country edge', 'Domestic edge'],
+              'year_range.value': [2002, 2022], 'level_input.value': 'Node', 'expanded_groups.data': [],
+              'rank_input.value': 'Degree'}
+    data = _expected(apps[0], apps[0].default_settings)
+    view_state = _post(clients[0], values, None, None)['view_state']['data']
+    kinds = []
+    # the session is opened by the first process, updated by the other one, then by the first one twice
+    for app, first_year in [(1, 2003), (0, 2004), (0, 2005)]:
+        values = {**values, 'year_range.value': [first_year, 2022]}
+        response = _post(clients[app], values, 'year_range.value', view_state)
+        update = response['graph']['data']
+        kinds.append('patch' if '__dash_patch_update' in update else 'full')
+        data = _apply(data, update)
+        view_state = response['view_state']['data']
+        assert data == _expected(apps[app], view_state['settings'])
+    # a process only patches the data it sent last
+    assert kinds == ['full', 'full', 'patch']
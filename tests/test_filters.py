@@ -0,0 +1,20 @@
+"""
+Tests of the setting panel filters
+"""
+# import
+from jaal import Jaal
+from jaal.datasets import make_coauthorship
+
+# Code
+#---------
+def test_clearing_the_search_shows_every_node():
+    edge_df, node_df = make_coauthorship(3000)
+    jaal = Jaal(edge_df, node_df, cache=False)
+    searched, _, _ = jaal.render_view({'search_text': 'City 1'})
+    cleared, _, _ = jaal.render_view({'search_text': ''})
+    # the browser merges the new node fields into the ones it holds, keys are never removed
+    browser = {node['id']: node for node in searched.to_visdcc(jaal.store)['nodes']}
+    assert any(node['hidden'] for node in browser.values())
+    for node in cleared.to_visdcc(jaal.store)['nodes']:
+        browser[node['id']].update(node)
+    assert all(node['hidden'] is False for node in browser.values())
@@ -0,0 +1,25 @@
+"""
+Tests of the filter query compiler
+"""
+# import
+import pytest
+import pandas as pd
+from jaal.query import CompiledQuery
+
+# Code
+#---------
+def test_pandas_expressions_beyond_the_grammar_still_run():
+    df = pd.DataFrame({'au_list': ['Smith A, Lee B', 'Kim C', 'Smith D'], 'npub': [3, 5, 8]})
+    assert CompiledQuery("au_list.str.contains('Smith') and npub > 4", df).mask(df).tolist() == [False, False, True]
+    assert CompiledQuery("npub > 4", df).mask(df).tolist() == [False, True, True]
+    assert CompiledQuery("index > 1", df).mask(df).tolist() == [False, False, True]
+    with pytest.raises(Exception, match="Invalid query"):
+        CompiledQuery("nope.str.contains('Smith')", df)
+    with pytest.raises(Exception, match="Unknown column"):
+        CompiledQuery("nope > 1", df)
+
+def test_equality_with_a_list_is_membership():
+    df = pd.DataFrame({'edgetype': ['LMLM', 'LMHC', 'HCHC', 'LMLM']})
+    for text in ["edgetype == ['LMLM', 'HCHC']", "['LMLM', 'HCHC'] == edgetype"]:
+        assert CompiledQuery(text, df).mask(df).tolist() == df.eval(text).tolist() == [True, False, True, True]
+    assert CompiledQuery("edgetype != ['LMLM']", df).mask(df).tolist() == [False, True, True, False]
@@ -0,0 +1,26 @@
+"""
+Tests of the node titles fetched on hover
+"""
+# import
+from jaal import Jaal
+from jaal.datasets import make_coauthorship
+
+# Code
+#---------
+def _tooltip_url(app):
+    """URL the hover hook of the graph fetches the titles from"""
+    run = app.layout['graph'].run
+    return run[run.index('fetch(') + len('fetch('):].split('+')[0].strip().strip('"')
+
+def test_tooltips_follow_the_path_prefix(monkeypatch):
+    edge_df, node_df = make_coauthorship(300)
+    node_id = str(node_df['id'].iloc[0])
+    for prefix in ['/', '/graph/']:
+        monkeypatch.setenv('DASH_URL_BASE_PATHNAME', prefix)
+        jaal = Jaal(edge_df.copy(), node_df.copy())
+        app = jaal.create(lazy_tooltips=True)
+        url = _tooltip_url(app)
+        assert url == f'{prefix}_jaal/tooltip?id='
+        response = app.server.test_client().get(url + node_id)
+        assert response.status_code == 200
+        assert response.get_data(as_text=True) == jaal.get_tooltip(node_id)